@@ -0,0 +1,145 @@
+"""Бенчмарк представления записей в памяти: ячейки openpyxl против EntryStore.
+
+Для книг разного размера измеряет время загрузки, память на одну запись
+(tracemalloc, удерживаемая после загрузки; время загрузки измеряется
+отдельно, без tracemalloc) и время агрегатов: часы по сотрудникам, по
+дням и по неделям.
+
+    python bench_entries.py --rows 1000 10000 50000
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import tempfile
+import tracemalloc
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+import openpyxl
+
+from entry_store import EntryStore
+
+HEADERS = ["Дата", "Время работы", "Описание работы", "Часы работы без обеда"]
+
+
+def build_workbook(path: str, rows: int, users: int = 30):
+    wb = openpyxl.Workbook(write_only=True)
+    sheets = []
+    for index in range(users):
+        sheet = wb.create_sheet(f"user_{1000 + index}")
+        sheet.append(HEADERS)
+        sheets.append(sheet)
+    first_day = date(2023, 1, 2)
+    for row in range(rows):
+        day = first_day + timedelta(days=row * 3 // users)
+        sheets[row % users].append([
+            day.strftime("%d.%m.%Y"),
+            "9:00-13:00, 14:00-18:00",
+            f"Задача #{row}: " + "описание работы " * random.randint(1, 6),
+            round(random.uniform(4, 9), 2),
+        ])
+    wb.save(path)
+
+
+def retained(load):
+    """Результат load() и удерживаемая им память в байтах"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = load()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def timed(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        timings.append(perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+# ---------- Подход через ячейки (как обычная загрузка книги) ----------
+
+def load_cells(path: str):
+    wb = openpyxl.load_workbook(path)
+    return [(sheet.title, row) for sheet in wb.worksheets for row in sheet.iter_rows(min_row=2)]
+
+
+def cells_by_user(rows):
+    result = {}
+    for title, row in rows:
+        result[title] = result.get(title, 0.0) + float(row[3].value or 0)
+    return result
+
+
+def cells_by_day(rows):
+    result = {}
+    for _, row in rows:
+        day = datetime.strptime(row[0].value, "%d.%m.%Y").date()
+        result[day] = result.get(day, 0.0) + float(row[3].value or 0)
+    return result
+
+
+def cells_by_week(rows):
+    result = {}
+    for _, row in rows:
+        day = datetime.strptime(row[0].value, "%d.%m.%Y").date()
+        week = day - timedelta(days=day.weekday())
+        result[week] = result.get(week, 0.0) + float(row[3].value or 0)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_entries_")
+    header = (f"{'строк':>7} | {'представление':<22} {'загрузка мс':>12} {'байт/запись':>12} "
+              f"{'по людям мс':>12} {'по дням мс':>11} {'по неделям мс':>14}")
+    print(header)
+    print("-" * len(header))
+
+    for rows in args.rows:
+        path = os.path.join(workdir, f"bench_{rows}.xlsx")
+        build_workbook(path, rows)
+
+        cells_load = timed(lambda: load_cells(path), 1)
+        cells, cells_memory = retained(lambda: load_cells(path))
+        cells_result = {
+            "by_user": timed(lambda: cells_by_user(cells), args.repeat),
+            "by_day": timed(lambda: cells_by_day(cells), args.repeat),
+            "by_week": timed(lambda: cells_by_week(cells), args.repeat),
+        }
+        expected = cells_by_user(cells)
+        del cells
+        gc.collect()
+
+        store_load = timed(lambda: EntryStore.load([path]), 1)
+        store, store_memory = retained(lambda: EntryStore.load([path]))
+        store_result = {
+            "by_user": timed(store.sum_by_sheet, args.repeat),
+            "by_day": timed(store.hours_by_day, args.repeat),
+            "by_week": timed(store.hours_by_week, args.repeat),
+        }
+        totals = {sheet: hours for sheet, (_, hours) in store.sum_by_sheet().items()}
+        assert all(abs(totals[sheet] - hours) < 1e-6 for sheet, hours in expected.items()), "суммы не совпадают"
+
+        for name, load_ms, memory, result in (
+            ("ячейки openpyxl", cells_load, cells_memory, cells_result),
+            ("EntryStore", store_load, store_memory, store_result),
+        ):
+            print(f"{rows:>7} | {name:<22} {load_ms:>12.1f} {memory / rows:>12.0f} "
+                  f"{result['by_user']:>12.2f} {result['by_day']:>11.2f} {result['by_week']:>14.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Бенчмарк пути резервного копирования на локальной замене Яндекс.Диска.
+
+Измеряет задержку и объем отправленных данных для upload_file, /sync
+(изменившийся и неизменный файл), записи с загрузкой после каждого
+изменения и ночной резервной копии на книгах разного размера.
+
+    python bench_yandex_sync.py --rows 100 1000 10000 --latency 0.02
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+
+from fake_yandex_disk import FakeYandexDisk
+
+FOLDER = "/Bench/Backups"
+
+
+def build_workbook(path: str, rows: int, users: int = 20):
+    from openpyxl import Workbook
+    from bot import ExcelManager
+
+    wb = Workbook()
+    sheets = []
+    for index in range(users):
+        sheet = wb.create_sheet(f"user_{1000 + index}")
+        ExcelManager._init_sheet(sheet)
+        sheets.append(sheet)
+    for row in range(rows):
+        day = 1 + row % 28
+        sheets[row % users].append([
+            f"{day:02d}.{1 + (row // 28) % 12:02d}.2025",
+            "9:00-13:00, 14:00-18:00",
+            f"Задача #{row}: " + "описание работы " * random.randint(1, 6),
+            7.5,
+        ])
+    wb.save(path)
+
+
+def measure(disk: FakeYandexDisk, func, *args, repeat: int = 1, setup=None):
+    timings = []
+    requests = 0
+    sent = 0
+    failures = 0
+    result = None
+    for _ in range(repeat):
+        # Подробный вывод бота не должен попадать в таблицу результатов
+        with contextlib.redirect_stdout(io.StringIO()):
+            if setup:
+                setup()
+            disk.reset_stats()
+            started = perf_counter()
+            result = func(*args)
+            timings.append(perf_counter() - started)
+            failures += result is False
+            requests += sum(disk.requests.values())
+            sent += disk.bytes_received
+    return {
+        "ms": statistics.median(timings) * 1000,
+        "sent_kb": sent / repeat / 1024,
+        "requests": requests / repeat,
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа замены, с")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle", type=float, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_yandex_")
+    disk = FakeYandexDisk(token="bench", latency=args.latency,
+                          error_rate=args.error_rate, throttle_rps=args.throttle).start()
+    disk.add_folder(FOLDER)
+
+    # Конфигурация читается при импорте bot, поэтому окружение задается до него
+    os.environ.update({
+        "EXCEL_DIR": workdir,
+        "YANDEX_DISK_TOKEN": "bench",
+        "YANDEX_DISK_API_URL": disk.url,
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot
+
+    header = f"{'строк':>7} {'файл КБ':>8} | {'операция':<28} {'мс':>9} {'отправлено КБ':>14} {'запросов':>9} {'сбоев':>6}"
+    print(f"Замена Яндекс.Диска: {disk.url}, задержка {args.latency} с, ошибки {args.error_rate}")
+    print(header)
+    print("-" * len(header))
+
+    try:
+        for rows in args.rows:
+            path = os.path.join(workdir, f"bench_{rows}.xlsx")
+            build_workbook(path, rows)
+            size_kb = os.path.getsize(path) / 1024
+            yandex = bot.YandexDiskManager("bench", api_url=disk.url)
+            manager = bot.ExcelManager(path, cloud=yandex, cloud_folder=FOLDER)
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.ensure_ready()
+            remote = f"{FOLDER}/bench_{rows}_raw.xlsx"
+
+            results = []
+            results.append(("upload_file", measure(disk, yandex.upload_file, path, remote, repeat=args.repeat)))
+
+            changes = iter(range(10_000, 20_000))
+
+            def change_workbook():
+                # Каждый раз новый пользователь, чтобы не упереться в лимит записей в день
+                user_id = next(changes)
+                manager.add_entry(user_id, "9:00-18:00", "изменение", False, f"user_{user_id}")
+
+            results.append(("/sync (файл изменился)", measure(disk, manager.backup_to_cloud,
+                                                              repeat=args.repeat, setup=change_workbook)))
+            results.append(("/sync (без изменений)", measure(disk, manager.backup_to_cloud, repeat=args.repeat)))
+
+            def add_and_delete(backup_on_write):
+                bot.YANDEX_BACKUP_ON_WRITE = backup_on_write
+                try:
+                    manager.add_entry(1, "9:00-18:00", "бенчмарк", True, "Бенчмарк")
+                    manager.delete_today_entry(1, "Бенчмарк")
+                finally:
+                    bot.YANDEX_BACKUP_ON_WRITE = False
+
+            results.append(("запись без загрузки", measure(disk, add_and_delete, False, repeat=args.repeat)))
+            results.append(("запись + загрузка (on write)", measure(disk, add_and_delete, True, repeat=args.repeat)))
+
+            results.append(("ночная копия", measure(disk, manager.publish_snapshot,
+                                                    repeat=args.repeat, setup=change_workbook)))
+
+            for name, result in results:
+                print(f"{rows:>7} {size_kb:>8.0f} | {name:<28} {result['ms']:>9.1f} "
+                      f"{result['sent_kb']:>14.1f} {result['requests']:>9.1f} {result['failures']:>6}")
+            print()
+    finally:
+        disk.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,32 @@
 import os
+import shutil
 import pytz
 import logging
 import asyncio
+import json
+import hashlib
+import functools
+import threading
 import requests
+import time as time_module
+from collections import Counter
+from time import perf_counter
 from datetime import datetime, time, timedelta
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram.constants import ChatType
+from telegram.helpers import escape_markdown
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, filters,
-    ContextTypes, ConversationHandler
+    ContextTypes, ConversationHandler, TypeHandler
 )
 import openpyxl
 from openpyxl import Workbook
 import re
 
+# ✅ Отсчет времени запуска
+STARTUP_STARTED = perf_counter()
+STARTUP_METRICS = {}
+
 # ✅ Устанавливаем часовой пояс
 TIMEZONE = pytz.timezone('Europe/Moscow')
 
@@ -33,15 +47,33 @@ logger = logging.getLogger(__name__)
 WAITING_TIME, WAITING_LUNCH_CONFIRMATION, WAITING_DESCRIPTION, WAITING_REMINDER_TIME = range(4)
 
 # Импорт конфигурации
+from config import print_config_summary
 from config import BOT_TOKEN, EXCEL_FILE, DEFAULT_REMINDER_HOUR, DEFAULT_REMINDER_MINUTE, USER_SETTINGS, WELCOMED_USERS, MAX_ENTRIES_PER_DAY, YANDEX_DISK_ENABLED, YANDEX_DISK_TOKEN, YANDEX_DISK_FOLDER
+from config import ADMIN_USER_IDS, CONCURRENT_UPDATES
+from config import TENANTS_FILE, TENANT_MEMBERS_FILE, TENANT_USERS_FILE, MAX_LOADED_TENANTS, TENANT_DEFAULT_OPEN
+from config import EXPORT_API_PORT, EXPORT_API_HOST, EXPORT_API_TOKEN
+from config import YANDEX_BACKUP_ON_WRITE, BACKUP_GENERATIONS, NIGHTLY_BACKUP_HOUR, NIGHTLY_BACKUP_MINUTE
+from config import YANDEX_DISK_API_URL, YANDEX_DISK_TIMEOUT
+from config import YANDEX_SYNC_STATE_FILE, YANDEX_BACKUP_FILENAME, ARCHIVE_GRANULARITY, ARCHIVE_HOUR, ARCHIVE_MINUTE
+from config import TELEGRAM_API_URL, OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_GROUP_RATE_PER_MINUTE, OUTBOX_MAX_RETRIES, OUTBOX_REPORT_INTERVAL
+from outbox import OutboundDispatcher
+from profiling import CpuProfiler, HeapTracker
+from update_processing import PerChatUpdateProcessor
+from export_api import ExportAPIServer
+from tenants import Tenant, TenantRegistry
+from entry_store import EntryStore, day_number, parse_periods
 
 # ✅ Глобальная ссылка на application для доступа к job_queue
 global_app = None
 
 class YandexDiskManager:
-    def __init__(self, token: str):
+    def __init__(self, token: str, api_url: str = YANDEX_DISK_API_URL, timeout: float = YANDEX_DISK_TIMEOUT):
         self.token = token
-        self.base_url = "https://cloud-api.yandex.net/v1/disk/resources"
+        # api_url можно направить на локальную замену (fake_yandex_disk.py)
+        self.base_url = f"{api_url.rstrip('/')}/v1/disk/resources"
+        self.timeout = timeout
+        # Одна сессия на менеджер: соединения переиспользуются между запросами
+        self.session = requests.Session()
         self.headers = {
             "Authorization": f"OAuth {token}",
             "Content-Type": "application/json"
@@ -51,7 +83,7 @@ class YandexDiskManager:
         """Проверяет существование папки на Яндекс.Диске"""
         try:
             url = f"{self.base_url}?path={folder_path}"
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
             if response.status_code == 200:
                 print(f"✅ Папка существует на Яндекс.Диске: {folder_path}")
                 return True
@@ -76,7 +108,7 @@ class YandexDiskManager:
 
             # Получаем URL для загрузки
             url = f"{self.base_url}/upload?path={remote_file_path}&overwrite=true"
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
             
             if response.status_code != 200:
                 print(f"❌ Ошибка получения URL для загрузки: {response.status_code} - {response.text}")
@@ -85,8 +117,9 @@ class YandexDiskManager:
             upload_url = response.json()["href"]
             
             # Загружаем файл
+            # Тело запроса - сам файл, без multipart-обертки
             with open(local_file_path, 'rb') as file:
-                upload_response = requests.put(upload_url, files={"file": file})
+                upload_response = self.session.put(upload_url, data=file, timeout=self.timeout)
             
             if upload_response.status_code in [200, 201]:
                 print(f"✅ Файл успешно загружен на Яндекс.Диск: {remote_file_path}")
@@ -103,7 +136,7 @@ class YandexDiskManager:
         """Получает информацию о файле на Яндекс.Диске"""
         try:
             url = f"{self.base_url}?path={file_path}"
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -112,13 +145,477 @@ class YandexDiskManager:
             print(f"❌ Ошибка получения информации о файле: {e}")
             return None
 
+    def download_file(self, remote_file_path: str, local_file_path: str):
+        """Скачивает файл с Яндекс.Диска, заменяя локальный файл атомарно"""
+        try:
+            response = self.session.get(f"{self.base_url}/download", params={"path": remote_file_path}, headers=self.headers, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"❌ Ошибка получения URL для скачивания: {response.status_code} - {response.text}")
+                return False
+
+            download_url = response.json()["href"]
+            tmp_path = f"{local_file_path}.download"
+            with self.session.get(download_url, stream=True, timeout=self.timeout) as download_response:
+                if download_response.status_code != 200:
+                    print(f"❌ Ошибка скачивания файла: {download_response.status_code}")
+                    return False
+                with open(tmp_path, 'wb') as file:
+                    for chunk in download_response.iter_content(chunk_size=65536):
+                        file.write(chunk)
+            os.replace(tmp_path, local_file_path)
+            print(f"✅ Файл скачан с Яндекс.Диска: {remote_file_path}")
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка при скачивании файла: {e}")
+            return False
+
+    def _load_sync_state(self):
+        try:
+            with open(YANDEX_SYNC_STATE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _synced(state: dict, remote_file_path: str):
+        """Запись о копии: {"sha256", "mtime"}; прежний формат хранил только хеш"""
+        value = state.get(remote_file_path)
+        if isinstance(value, str):
+            return {"sha256": value}
+        return value or {}
+
+    def _save_sync_state(self, state: dict):
+        try:
+            os.makedirs(os.path.dirname(YANDEX_SYNC_STATE_FILE) or '.', exist_ok=True)
+            with open(YANDEX_SYNC_STATE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить состояние синхронизации: {e}")
+
+    def upload_if_changed(self, local_file_path: str, remote_file_path: str, force: bool = False):
+        """Загружает файл, только если его содержимое отличается от последней копии.
+
+        Возвращает "uploaded", "unchanged" или False при ошибке.
+        """
+        local_hash = file_sha256(local_file_path)
+        state = self._load_sync_state()
+        if not force:
+            if self._synced(state, remote_file_path).get("sha256") == local_hash:
+                print(f"⏭️ Файл не изменился с последней загрузки: {remote_file_path}")
+                return "unchanged"
+            file_info = self.get_file_info(remote_file_path)
+            if file_info and file_info.get('sha256') == local_hash:
+                self.mark_synced(local_file_path, remote_file_path, local_hash=local_hash)
+                print(f"⏭️ Копия на Яндекс.Диске совпадает с локальным файлом: {remote_file_path}")
+                return "unchanged"
+
+        local_mtime = os.path.getmtime(local_file_path)
+        if not self.upload_file(local_file_path, remote_file_path):
+            return False
+        self.mark_synced(local_file_path, remote_file_path, local_hash=local_hash, local_mtime=local_mtime)
+        return "uploaded"
+
+    def mark_synced(self, local_file_path: str, remote_file_path: str, local_hash: str = None,
+                    local_mtime: float = None):
+        """Запоминает, что копия на Яндекс.Диске получена из локального файла
+        с таким хешем и временем изменения"""
+        state = self._load_sync_state()
+        state[remote_file_path] = {
+            "sha256": local_hash or file_sha256(local_file_path),
+            "mtime": local_mtime if local_mtime is not None else os.path.getmtime(local_file_path),
+        }
+        self._save_sync_state(state)
+
+    def synced_hash(self, remote_file_path: str):
+        """Хеш локального файла, из которого была получена копия remote_file_path"""
+        return self._synced(self._load_sync_state(), remote_file_path).get("sha256")
+
+    def synced_mtime(self, remote_file_path: str):
+        """Время изменения локального файла, из которого была получена копия (или None)"""
+        return self._synced(self._load_sync_state(), remote_file_path).get("mtime")
+
+    def copy_file(self, from_path: str, to_path: str):
+        """Копирует файл внутри Яндекс.Диска с перезаписью"""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/copy",
+                params={"from": from_path, "path": to_path, "overwrite": "true"},
+                headers=self.headers,
+                timeout=self.timeout
+            )
+            if response.status_code == 201:
+                return True
+            if response.status_code == 202:
+                # Копирование идет асинхронно: ждем завершения операции
+                return self.wait_operation(response.json()["href"])
+            print(f"❌ Ошибка копирования {from_path} -> {to_path}: {response.status_code} - {response.text}")
+            return False
+        except Exception as e:
+            print(f"❌ Ошибка при копировании файла: {e}")
+            return False
+
+    def wait_operation(self, operation_url: str, poll_interval: float = 1.0):
+        """Ждет завершения асинхронной операции Яндекс.Диска. True - операция выполнена"""
+        deadline = time_module.monotonic() + self.timeout
+        try:
+            while True:
+                response = self.session.get(operation_url, headers=self.headers, timeout=self.timeout)
+                if response.status_code != 200:
+                    print(f"❌ Ошибка проверки операции: {response.status_code} - {response.text}")
+                    return False
+                status = response.json().get("status")
+                if status == "success":
+                    return True
+                if status == "failed":
+                    print(f"❌ Операция на Яндекс.Диске завершилась ошибкой: {operation_url}")
+                    return False
+                if time_module.monotonic() >= deadline:
+                    print(f"❌ Операция на Яндекс.Диске не завершилась за {self.timeout} с")
+                    return False
+                time_module.sleep(poll_interval)
+        except Exception as e:
+            print(f"❌ Ошибка при ожидании операции: {e}")
+            return False
+
+    def list_folder(self, folder_path: str):
+        """Имена файлов в папке на Яндекс.Диске"""
+        try:
+            response = self.session.get(
+                self.base_url,
+                params={"path": folder_path, "limit": 1000, "fields": "_embedded.items.name,_embedded.items.type"},
+                headers=self.headers,
+                timeout=self.timeout
+            )
+            if response.status_code != 200:
+                print(f"❌ Ошибка чтения папки {folder_path}: {response.status_code}")
+                return []
+            items = response.json().get('_embedded', {}).get('items', [])
+            return [item['name'] for item in items if item.get('type') == 'file']
+        except Exception as e:
+            print(f"❌ Ошибка при чтении папки: {e}")
+            return []
+
+    def delete_file(self, remote_file_path: str):
+        """Удаляет файл с Яндекс.Диска без помещения в корзину"""
+        try:
+            response = self.session.delete(
+                self.base_url,
+                params={"path": remote_file_path, "permanently": "true"},
+                headers=self.headers,
+                timeout=self.timeout
+            )
+            return response.status_code in [202, 204]
+        except Exception as e:
+            print(f"❌ Ошибка при удалении файла: {e}")
+            return False
+
+def file_sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 # ✅ Инициализация менеджера Яндекс.Диска
 yandex_disk = YandexDiskManager(YANDEX_DISK_TOKEN) if YANDEX_DISK_ENABLED and YANDEX_DISK_TOKEN else None
 
+def _with_storage(method):
+    """Гарантирует готовность файла и выполняет метод под блокировкой хранилища"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Готовность проверяется под блокировкой: между проверкой и вызовом
+        # хранилище могло быть выгружено из памяти (см. unload)
+        with self._lock:
+            self.ensure_ready()
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _with_file(method):
+    """Выполняет метод под блокировкой хранилища без построения индексов:
+    для операций с файлом целиком (архивация, копирование)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            self._restore_once()
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class ExcelManager:
-    def __init__(self, filename: str):
+    # Скрытый лист с привязкой user_id -> лист; хранится в самой книге,
+    # поэтому переживает восстановление из резервной копии
+    USERS_SHEET = "_users"
+
+    def __init__(self, filename: str, cloud: YandexDiskManager = None, cloud_folder: str = YANDEX_DISK_FOLDER):
+        # Конструктор не трогает диск: файл проверяется в ensure_ready()
         self.filename = filename
-        self._ensure_file_exists()
+        self.cloud = cloud
+        self.cloud_folder = cloud_folder
+        self.remote_file_path = f"{cloud_folder}/{YANDEX_BACKUP_FILENAME}"
+        self.archive_dir = os.path.join(os.path.dirname(filename), "archive")
+        self._user_sheets = {}  # user_id -> лист
+        self._entries = EntryStore()  # все записи, включая архивы, в компактных столбцах
+        self._lock = threading.RLock()
+        self._ready = False
+        self._restored = False  # восстановление из облака - только при первой загрузке
+        # Версия данных растет при каждом изменении записей (ETag для экспорта)
+        self.data_version = 0
+        self.last_modified = 0.0
+        self._export_cache = None
+
+    def ensure_ready(self):
+        """Однократная подготовка хранилища: проверка файла и построение индексов"""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            started = perf_counter()
+            self._restore_once()
+            self._ensure_file_exists()
+            self._validate_workbook()
+            self._load_user_registry()
+            self._build_index()
+            # После выгрузки из памяти время изменения не должно откатываться назад
+            self.last_modified = max(self.last_modified, os.path.getmtime(self.filename))
+            self._ready = True
+            print(f"✅ Хранилище готово за {perf_counter() - started:.2f} с")
+
+    def _restore_once(self):
+        # Вызывается под блокировкой; после выгрузки из памяти локальный файл уже актуален
+        if not self._restored:
+            self._restore_from_cloud()
+            self._restore_archives_from_cloud()
+            self._restored = True
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def unload(self):
+        """Освобождает память: реестр пользователей и индекс записей будут
+        построены заново при следующем обращении. Занятое хранилище не
+        выгружается - тогда возвращает False."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._ready = False
+            self._user_sheets = {}
+            self._entries = EntryStore()
+            self._export_cache = None
+        finally:
+            self._lock.release()
+        return True
+
+    def _restore_from_cloud(self):
+        """Скачивает резервную копию, если локального файла нет или он старше облачного"""
+        if not self.cloud:
+            return
+        file_info = self.cloud.get_file_info(self.remote_file_path)
+        if not file_info:
+            print("☁️ Резервной копии на Яндекс.Диске нет, восстановление не требуется")
+            return
+
+        if os.path.exists(self.filename):
+            local_hash = file_sha256(self.filename)
+            # Копия в облаке совпадает с локальным файлом или получена из него (ночной снимок)
+            if local_hash in (file_info.get('sha256'), self.cloud.synced_hash(self.remote_file_path)):
+                return
+            # Если копия сделана отсюда, сравниваем с временем изменения ее исходного
+            # файла: запись, сохраненная во время загрузки снимка, старше момента
+            # загрузки, но новее снимка и не должна теряться
+            copy_source_mtime = self.cloud.synced_mtime(self.remote_file_path)
+            if copy_source_mtime is None:
+                try:
+                    copy_source_mtime = datetime.fromisoformat(file_info.get('modified', '')).timestamp()
+                except ValueError:
+                    return
+            if os.path.getmtime(self.filename) >= copy_source_mtime:
+                return
+            print("☁️ Локальный файл старше резервной копии на Яндекс.Диске")
+        else:
+            print("☁️ Локальный файл отсутствует, восстанавливаю из Яндекс.Диска")
+            directory = os.path.dirname(self.filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        # Копия скачивается рядом, и локальный файл заменяется только после
+        # успешного скачивания - иначе бот начал бы работу с пустой книгой
+        restored_path = f"{self.filename}.restore"
+        if not self.cloud.download_file(self.remote_file_path, restored_path):
+            if not os.path.exists(self.filename):
+                # Пустая книга вместо данных затерла бы резервную копию при следующей загрузке
+                raise RuntimeError(f"Не удалось скачать резервную копию {self.remote_file_path}")
+            print("⚠️ Не удалось скачать резервную копию, продолжаю с локальным файлом")
+            return
+        if os.path.exists(self.filename):
+            backup = f"{self.filename}.before-restore"
+            os.replace(self.filename, backup)
+            print(f"💾 Прежний локальный файл сохранен как {backup}")
+        os.replace(restored_path, self.filename)
+        self.cloud.mark_synced(self.filename, self.remote_file_path)
+        print(f"✅ Данные восстановлены из резервной копии: {self.remote_file_path}")
+
+    def _restore_archives_from_cloud(self):
+        """Скачивает архивы, которых нет локально: рабочий файл уже сокращен,
+        и без них закрытые периоды пропали бы из статистики и /download"""
+        if not self.cloud:
+            return
+        prefix = self._archive_prefix()
+        local = {os.path.basename(path) for _, path in self.list_archives()}
+        missing = [name for name in self.cloud.list_folder(self.cloud_folder)
+                   if name.startswith(prefix) and name.endswith(".xlsx") and name not in local]
+        if not missing:
+            return
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for name in missing:
+            remote_path = f"{self.cloud_folder}/{name}"
+            path = os.path.join(self.archive_dir, name)
+            if self.cloud.download_file(remote_path, path):
+                os.chmod(path, 0o444)
+                self.cloud.mark_synced(path, remote_path)
+                print(f"🗄️ Архив восстановлен с Яндекс.Диска: {name}")
+
+    @_with_file
+    def backup_to_cloud(self, force: bool = False):
+        """Загружает файл на Яндекс.Диск, если он изменился. Возвращает статус upload_if_changed"""
+        if not self.cloud:
+            return False
+        return self.cloud.upload_if_changed(self.filename, self.remote_file_path, force=force)
+
+    def backup_archives_to_cloud(self, paths):
+        """Загружает архивные файлы рядом с основной резервной копией"""
+        if not self.cloud:
+            return
+        for path in paths:
+            self.cloud.upload_if_changed(path, f"{self.cloud_folder}/{os.path.basename(path)}")
+
+    def _data_paths(self):
+        return [path for _, path in self.list_archives()] + [self.filename]
+
+    def _build_index(self):
+        """Один проход по архивам и рабочему файлу: записи в компактных столбцах"""
+        paths = self._data_paths()
+        self._entries = EntryStore.load(paths, skip_sheets={self.USERS_SHEET})
+        print(f"📇 Индекс записей построен: {self._entries.day_count()} дней, файлов: {len(paths)}")
+
+    @_with_storage
+    def team_summary(self, start_date, end_date, active_days: int = 30):
+        """Сводка по команде за период [start_date, end_date] из индекса, без чтения файлов.
+
+        Возвращает часы и количество записей по сотрудникам, общий итог и,
+        для сотрудников, отчитывавшихся за последние active_days дней,
+        количество рабочих дней без отчета.
+        """
+        people = {
+            sheet_name: {'entries': entries, 'hours': hours}
+            for sheet_name, (entries, hours) in self._entries.sum_by_sheet(start_date, end_date).items()
+        }
+        reported_days = self._entries.days_by_sheet(start_date, end_date)
+
+        active = set(people)
+        active_from = end_date - timedelta(days=active_days)
+        if active_from < start_date:
+            active.update(self._entries.sheets_between(active_from, start_date - timedelta(days=1)))
+
+        # Будущие дни не считаются пропущенными
+        workdays = []
+        day = start_date
+        last_day = min(end_date, datetime.now().date())
+        while day <= last_day:
+            if day.weekday() < 5:
+                workdays.append(day)
+            day += timedelta(days=1)
+        missing = {}
+        for sheet_name in active:
+            days_missing = sum(1 for workday in workdays if workday not in reported_days.get(sheet_name, ()))
+            if days_missing:
+                missing[sheet_name] = days_missing
+
+        return {
+            'people': people,
+            'total_hours': sum(person['hours'] for person in people.values()),
+            'total_entries': sum(person['entries'] for person in people.values()),
+            'missing': missing,
+            'workdays': len(workdays)
+        }
+
+    def publish_snapshot(self, generations: int = BACKUP_GENERATIONS):
+        """Ночная резервная копия: согласованный снимок, уплотнение, одна загрузка.
+
+        Снимок публикуется как датированное поколение, затем копируется
+        в основную резервную копию на стороне Яндекс.Диска. Старые поколения
+        сверх generations удаляются. Возвращает "uploaded", "unchanged" или False.
+        """
+        if not self.cloud:
+            return False
+        snapshot_path = f"{self.filename}.snapshot.xlsx"
+        compact_path = f"{self.filename}.compact.xlsx"
+        try:
+            # Под блокировкой только копирование файла - записи не ждут загрузку.
+            # Индексы для копии не нужны, поэтому книга не загружается в память
+            with self._lock:
+                self._restore_once()
+                shutil.copy2(self.filename, snapshot_path)
+            source_hash = file_sha256(snapshot_path)
+            if self.cloud.synced_hash(self.remote_file_path) == source_hash:
+                print("⏭️ Данные не менялись с последней резервной копии")
+                return "unchanged"
+
+            self._compact_workbook(snapshot_path, compact_path)
+
+            backup_base = os.path.splitext(YANDEX_BACKUP_FILENAME)[0]
+            generation_path = f"{self.cloud_folder}/{backup_base}_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
+            if not self.cloud.upload_file(compact_path, generation_path):
+                return False
+            if not self.cloud.copy_file(generation_path, self.remote_file_path):
+                return False
+            self.cloud.mark_synced(self.filename, self.remote_file_path, local_hash=source_hash,
+                                   local_mtime=os.path.getmtime(snapshot_path))
+            print(f"✅ Ночная резервная копия опубликована: {generation_path}")
+
+            self._prune_generations(backup_base, generations)
+            return "uploaded"
+        finally:
+            for path in (snapshot_path, compact_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _compact_workbook(self, source_path: str, target_path: str):
+        """Пересобирает книгу с нуля: только значения, без пустых строк и накопленного мусора"""
+        source = openpyxl.load_workbook(source_path, read_only=True)
+        target = Workbook()
+        target.remove(target.active)
+        for source_sheet in source.worksheets:
+            sheet = target.create_sheet(source_sheet.title)
+            if source_sheet.title == self.USERS_SHEET:
+                sheet.sheet_state = 'hidden'
+                sheet.append(["user_id", "Лист", "Фамилия"])
+            else:
+                self._init_sheet(sheet)
+            for row in source_sheet.iter_rows(min_row=2, values_only=True):
+                if any(value is not None for value in row):
+                    sheet.append(row)
+        source.close()
+        target.save(target_path)
+
+    def _prune_generations(self, backup_base: str, generations: int):
+        pattern = re.compile(rf"^{re.escape(backup_base)}_\d{{4}}-\d{{2}}-\d{{2}}\.xlsx$")
+        dated = sorted((name for name in self.cloud.list_folder(self.cloud_folder) if pattern.match(name)), reverse=True)
+        for name in dated[generations:]:
+            if self.cloud.delete_file(f"{self.cloud_folder}/{name}"):
+                print(f"🧹 Удалено старое поколение резервной копии: {name}")
+
+    def _validate_workbook(self):
+        """Проверяет, что файл открывается; поврежденный файл откладывается в сторону"""
+        try:
+            wb = openpyxl.load_workbook(self.filename, read_only=True)
+            print(f"📄 Листов в файле: {len(wb.sheetnames)}")
+            wb.close()
+        except Exception as e:
+            broken = f"{self.filename}.broken-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            print(f"❌ Файл поврежден ({e}), сохраняю копию как {broken}")
+            os.replace(self.filename, broken)
+            self._ensure_file_exists()
 
     def _ensure_file_exists(self):
         """Создаёт файл, если не существует."""
@@ -143,8 +640,53 @@ class ExcelManager:
             import traceback
             traceback.print_exc()
 
+    def _load_user_registry(self):
+        """Загружает привязку user_id -> лист и переносит в нее листы вида user_<id>"""
+        wb = openpyxl.load_workbook(self.filename)
+        self._user_sheets = {}
+        if self.USERS_SHEET in wb.sheetnames:
+            for row in wb[self.USERS_SHEET].iter_rows(min_row=2, values_only=True):
+                if row and row[0] is not None and row[1] in wb.sheetnames:
+                    self._user_sheets[int(row[0])] = row[1]
+
+        # Листы старого формата с id в названии однозначно принадлежат пользователю
+        migrated = 0
+        claimed = set(self._user_sheets.values())
+        for sheet_name in wb.sheetnames:
+            match = re.fullmatch(r'user_(\d+)', sheet_name)
+            if match and sheet_name not in claimed and int(match.group(1)) not in self._user_sheets:
+                self._register_user(wb, int(match.group(1)), sheet_name, "")
+                migrated += 1
+        if migrated:
+            wb.save(self.filename)
+        print(f"👥 Реестр пользователей: {len(self._user_sheets)} (перенесено {migrated})")
+
+    def _register_user(self, wb, user_id: int, sheet_name: str, last_name: str):
+        if self.USERS_SHEET in wb.sheetnames:
+            users_sheet = wb[self.USERS_SHEET]
+        else:
+            users_sheet = wb.create_sheet(self.USERS_SHEET)
+            users_sheet.append(["user_id", "Лист", "Фамилия"])
+            users_sheet.sheet_state = 'hidden'
+        users_sheet.append([user_id, sheet_name, last_name])
+        self._user_sheets[user_id] = sheet_name
+
+    def data_sheets(self, wb):
+        """Листы с записями (без служебного реестра пользователей)"""
+        return [sheet for sheet in wb.worksheets if sheet.title != self.USERS_SHEET]
+
+    @_with_storage
     def get_user_sheet(self, user_id: int, last_name: str = ""):
-        """Возвращает или создаёт лист для пользователя"""
+        """Возвращает или создаёт лист для пользователя.
+
+        Известный пользователь находится по реестру без обращения к файлу.
+        Новому пользователю достается существующий лист с его фамилией, если
+        тот еще никем не занят (перенос старых данных), иначе создается новый.
+        """
+        sheet_name = self._user_sheets.get(user_id)
+        if sheet_name:
+            return sheet_name
+
         try:
             wb = openpyxl.load_workbook(self.filename)
         except Exception as e:
@@ -152,78 +694,128 @@ class ExcelManager:
             self._ensure_file_exists()
             wb = openpyxl.load_workbook(self.filename)
 
-        if last_name and last_name.strip():
-            sheet_name = ''.join(c for c in last_name.strip() if c.isalnum() or c in ' _-')[:31]
-            if not sheet_name:
-                sheet_name = f"user_{user_id}"
+        sheet_name = self._sheet_name_for(user_id, last_name)
+        claimed = set(self._user_sheets.values()) | {self.USERS_SHEET}
+        if sheet_name in claimed:
+            # Однофамилец: отдельный лист с id в названии
+            suffix = f"_{user_id}"
+            sheet_name = f"{sheet_name[:31 - len(suffix)]}{suffix}"
+
+        if sheet_name in wb.sheetnames:
+            print(f"🔗 Лист {sheet_name} привязан к пользователю {user_id}")
         else:
-            sheet_name = f"user_{user_id}"
-
-        if sheet_name not in wb.sheetnames:
-            sheet = wb.create_sheet(sheet_name)
-            sheet['A1'] = "Дата"
-            sheet['B1'] = "Время работы"
-            sheet['C1'] = "Описание работы"
-            sheet['D1'] = "Часы работы без обеда"
-            sheet.column_dimensions['A'].width = 12
-            sheet.column_dimensions['B'].width = 15
-            sheet.column_dimensions['C'].width = 50
-            sheet.column_dimensions['D'].width = 20
-            bold_font = openpyxl.styles.Font(bold=True)
-            for cell in ['A1', 'B1', 'C1', 'D1']:
-                sheet[cell].font = bold_font
+            self._init_sheet(wb.create_sheet(sheet_name))
             print(f"✅ Создан новый лист: {sheet_name}")
+        self._register_user(wb, user_id, sheet_name, last_name)
         wb.save(self.filename)
         return sheet_name
 
+    def _known_sheet(self, user_id: int, last_name: str = ""):
+        """Лист пользователя для чтения, без создания нового.
+
+        Старый лист с фамилией еще не зарегистрированного пользователя
+        закрепляется за ним сразу, а не при первой новой записи - иначе
+        статистика, напоминания и лимит записей не видели бы его данных.
+        """
+        sheet_name = self._user_sheets.get(user_id)
+        if sheet_name is None and last_name:
+            legacy_name = self._sheet_name_for(user_id, last_name)
+            if legacy_name in self._entries.sheets and legacy_name not in self._user_sheets.values():
+                sheet_name = self.get_user_sheet(user_id, last_name)
+        return sheet_name
+
+    def modified_at(self):
+        """Время последнего изменения данных; книгу не загружает (для Last-Modified)"""
+        if self.last_modified:
+            return self.last_modified
+        try:
+            return os.path.getmtime(self.filename)
+        except OSError:
+            return 0.0
+
+    def _data_changed(self):
+        self.data_version += 1
+        self.last_modified = time_module.time()
+        self._export_cache = None
+
+    @_with_storage
+    def export_entries(self):
+        """Все записи (рабочий файл и архивы) для выгрузки во внешние системы.
+
+        Результат кешируется до следующего изменения данных.
+        """
+        if self._export_cache and self._export_cache[0] == self.data_version:
+            return self._export_cache[1]
+        sheet_users = {sheet_name: user_id for user_id, sheet_name in self._user_sheets.items()}
+        # Тексты нужны только выгрузке, поэтому в индексе их нет - читаем тем же загрузчиком
+        store = EntryStore.load(self._data_paths(), skip_sheets={self.USERS_SHEET}, with_text=True)
+        entries = []
+        for row in store.rows():
+            entries.append({
+                'user_id': sheet_users.get(row['sheet']),
+                'sheet': row['sheet'],
+                'date': row['date'].isoformat(),
+                'time_range': row['time_range'],
+                'description': row['description'],
+                'hours': row['hours']
+            })
+        entries.sort(key=lambda entry: (entry['date'], entry['sheet']))
+        self._export_cache = (self.data_version, entries)
+        return entries
+
+    @staticmethod
+    def _sheet_name_for(user_id: int, last_name: str = ""):
+        if last_name and last_name.strip():
+            sheet_name = ''.join(c for c in last_name.strip() if c.isalnum() or c in ' _-')[:31]
+            if sheet_name:
+                return sheet_name
+        return f"user_{user_id}"
+
+    @staticmethod
+    def _today():
+        return datetime.now().strftime("%d.%m.%Y")
+
+    @staticmethod
+    def _init_sheet(sheet):
+        """Заголовки и ширина колонок листа пользователя"""
+        sheet['A1'] = "Дата"
+        sheet['B1'] = "Время работы"
+        sheet['C1'] = "Описание работы"
+        sheet['D1'] = "Часы работы без обеда"
+        sheet.column_dimensions['A'].width = 12
+        sheet.column_dimensions['B'].width = 15
+        sheet.column_dimensions['C'].width = 50
+        sheet.column_dimensions['D'].width = 20
+        bold_font = openpyxl.styles.Font(bold=True)
+        for cell in ['A1', 'B1', 'C1', 'D1']:
+            sheet[cell].font = bold_font
+
     def calculate_work_hours(self, time_range: str, had_lunch: bool = False):
         """Поддерживает несколько периодов, разделённых запятыми."""
         try:
-            total_seconds = 0
-            periods = re.split(r',\s*', time_range.strip())
-            for period in periods:
-                if not period:
-                    continue
-                clean_period = re.sub(r'[с\-\–\—]', ' ', period).strip()
-                times = re.findall(r'(\d{1,2}:\d{2}|\d{1,2})', clean_period)
-                if len(times) >= 2:
-                    start_str = times[0]
-                    end_str = times[1]
-                    if ':' not in start_str:
-                        start_str += ':00'
-                    if ':' not in end_str:
-                        end_str += ':00'
-                    start = datetime.strptime(start_str, '%H:%M')
-                    end = datetime.strptime(end_str, '%H:%M')
-                    if end < start:
-                        end += timedelta(days=1)
-                    total_seconds += (end - start).total_seconds()
-
-            total_hours = total_seconds / 3600
+            # Тот же разбор периодов использует индекс записей (время начала и конца дня)
+            total_hours = sum(end - start for start, end in parse_periods(time_range)) / 60
             work_hours = total_hours - (0.5 if had_lunch else 0)
             return round(max(work_hours, 0), 2)
         except Exception as e:
             print(f"Ошибка вычисления часов: {e}")
             return 0.0
 
+    @_with_storage
+    def today_entry_count(self, user_id: int, last_name: str = ""):
+        """Количество записей пользователя за сегодня - из индекса, без чтения файла"""
+        sheet_name = self._known_sheet(user_id, last_name)
+        return self._entries.count(sheet_name, datetime.now().date())
+
     def has_today_entry(self, user_id: int, last_name: str = ""):
         """Проверяет, есть ли уже запись за сегодня"""
-        try:
-            wb = openpyxl.load_workbook(self.filename)
-            sheet_name = self.get_user_sheet(user_id, last_name)
-            sheet = wb[sheet_name]
-            
-            current_date = datetime.now().strftime("%d.%m.%Y")
-            
-            for row in range(2, sheet.max_row + 1):
-                date_cell = sheet[f'A{row}']
-                if date_cell.value == current_date:
-                    return True
-            return False
-        except Exception as e:
-            print(f"❌ Ошибка при проверке записи за сегодня: {e}")
-            return False
+        return self.today_entry_count(user_id, last_name) > 0
+
+    def can_add_entry(self, user_id: int, last_name: str = ""):
+        """Проверяет, не исчерпан ли лимит MAX_ENTRIES_PER_DAY"""
+        return self.today_entry_count(user_id, last_name) < MAX_ENTRIES_PER_DAY
 
+    @_with_storage
     def add_entry(self, user_id: int, time_range: str, description: str, had_lunch: bool, last_name: str = ""):
         try:
             print(f"🔧 Попытка сохранить запись для user_id: {user_id}")
@@ -231,7 +823,7 @@ class ExcelManager:
             print(f"📝 Данные: {time_range}, {description}, обед: {had_lunch}")
 
             # Проверяем лимит записей
-            if self.has_today_entry(user_id, last_name):
+            if not self.can_add_entry(user_id, last_name):
                 return False, "limit_exceeded"
 
             # Гарантируем существование листа
@@ -241,17 +833,18 @@ class ExcelManager:
 
             row = sheet.max_row + 1
             work_hours = self.calculate_work_hours(time_range, had_lunch)
-            current_date = datetime.now().strftime("%d.%m.%Y")
+            current_date = self._today()
             sheet[f'A{row}'] = current_date
             sheet[f'B{row}'] = time_range
             sheet[f'C{row}'] = description
             sheet[f'D{row}'] = work_hours
             wb.save(self.filename)
+            self._entries.add(day_number(current_date), sheet_name, time_range, work_hours)
+            self._data_changed()
             
             # ✅ Сохраняем на Яндекс.Диск после добавления записи
-            if yandex_disk:
-                remote_file_path = f"{YANDEX_DISK_FOLDER}/work_tracker_backup.xlsx"
-                if yandex_disk.upload_file(self.filename, remote_file_path):
+            if self.cloud and YANDEX_BACKUP_ON_WRITE:
+                if self.backup_to_cloud():
                     print(f"✅ Резервная копия загружена на Яндекс.Диск")
                 else:
                     print(f"⚠️ Не удалось загрузить резервную копию на Яндекс.Диск")
@@ -264,55 +857,234 @@ class ExcelManager:
             traceback.print_exc()
             return False, "error"
 
-    def delete_today_entry(self, user_id: int, last_name: str = ""):
-        """Удаляет последнюю запись за сегодня"""
+    def _today_rows(self, sheet, count: int):
+        """Номера строк сегодняшних записей в хронологическом порядке.
+
+        Записи добавляются в конец листа, поэтому просмотр идет с конца
+        и останавливается, как только найдено count строк.
+        """
+        current_date = self._today()
+        rows = []
+        for row in range(sheet.max_row, 1, -1):
+            if len(rows) >= count:
+                break
+            if sheet[f'A{row}'].value == current_date:
+                rows.append(row)
+        return list(reversed(rows))
+
+    @staticmethod
+    def _row_data(sheet, row: int):
+        return {
+            'date': sheet[f'A{row}'].value,
+            'time_range': sheet[f'B{row}'].value,
+            'description': sheet[f'C{row}'].value,
+            'work_hours': sheet[f'D{row}'].value
+        }
+
+    @_with_storage
+    def get_today_entries(self, user_id: int, last_name: str = ""):
+        """Сегодняшние записи пользователя по порядку добавления"""
+        count = self.today_entry_count(user_id, last_name)
+        if not count:
+            return []
         try:
             wb = openpyxl.load_workbook(self.filename)
-            sheet_name = self.get_user_sheet(user_id, last_name)
+            sheet = wb[self._user_sheets[user_id]]
+            return [self._row_data(sheet, row) for row in self._today_rows(sheet, count)]
+        except Exception as e:
+            print(f"❌ Ошибка при чтении записей за сегодня: {e}")
+            return []
+
+    @_with_storage
+    def delete_today_entry(self, user_id: int, last_name: str = "", entry_number: int = None):
+        """Удаляет запись за сегодня: entry_number-ю по порядку (с 1) или последнюю"""
+        try:
+            count = self.today_entry_count(user_id, last_name)
+            if not count:
+                return False, None
+
+            sheet_name = self._user_sheets[user_id]
+            wb = openpyxl.load_workbook(self.filename)
             sheet = wb[sheet_name]
-            
-            current_date = datetime.now().strftime("%d.%m.%Y")
-            deleted_data = None
-            
-            for row in range(sheet.max_row, 1, -1):
-                date_cell = sheet[f'A{row}']
-                if date_cell.value == current_date:
-                    deleted_data = {
-                        'date': sheet[f'A{row}'].value,
-                        'time_range': sheet[f'B{row}'].value,
-                        'description': sheet[f'C{row}'].value,
-                        'work_hours': sheet[f'D{row}'].value
-                    }
-                    sheet.delete_rows(row)
-                    wb.save(self.filename)
+
+            rows = self._today_rows(sheet, count)
+            if not rows:
+                return False, None
+            if entry_number is None:
+                row = rows[-1]
+            elif 1 <= entry_number <= len(rows):
+                row = rows[entry_number - 1]
+            else:
+                return False, None
+
+            deleted_data = self._row_data(sheet, row)
+            sheet.delete_rows(row)
+            wb.save(self.filename)
+            self._entries.remove(day_number(deleted_data['date']), sheet_name, deleted_data['work_hours'])
+            self._data_changed()
                     
-                    # ✅ Сохраняем на Яндекс.Диск после удаления записи
-                    if yandex_disk:
-                        remote_file_path = f"{YANDEX_DISK_FOLDER}/work_tracker_backup.xlsx"
-                        if yandex_disk.upload_file(self.filename, remote_file_path):
-                            print(f"✅ Резервная копия загружена на Яндекс.Диск после удаления")
+            # ✅ Сохраняем на Яндекс.Диск после удаления записи
+            if self.cloud and YANDEX_BACKUP_ON_WRITE:
+                if self.backup_to_cloud():
+                    print(f"✅ Резервная копия загружена на Яндекс.Диск после удаления")
                     
-                    print(f"✅ Запись за сегодня удалена для пользователя {user_id}")
-                    return True, deleted_data
-            
-            return False, None
+            print(f"✅ Запись за сегодня удалена для пользователя {user_id}")
+            return True, deleted_data
         except Exception as e:
             print(f"❌ Ошибка при удалении записи: {e}")
             return False, None
 
+    @_with_storage
     def get_user_stats(self, user_id: int, last_name: str = ""):
+        """Количество записей пользователя, включая архивы"""
         try:
-            wb = openpyxl.load_workbook(self.filename)
-            sheet_name = self.get_user_sheet(user_id, last_name)
-            sheet = wb[sheet_name]
-            return sheet.max_row - 1
+            sheet_name = self._known_sheet(user_id, last_name)
+            return self._entries.total(sheet_name)
         except Exception as e:
             print(f"❌ Ошибка при получении статистики: {e}")
             return 0
 
-excel_manager = ExcelManager(EXCEL_FILE)
+    # ---------- Архив ----------
+
+    def _period_of(self, date_value):
+        """Период архивации для даты записи: 'ГГГГ-ММ' или 'ГГГГ'"""
+        try:
+            date = datetime.strptime(str(date_value), "%d.%m.%Y")
+        except ValueError:
+            return None
+        return date.strftime("%Y") if ARCHIVE_GRANULARITY == "year" else date.strftime("%Y-%m")
+
+    def _archive_prefix(self):
+        base = os.path.splitext(os.path.basename(self.filename))[0]
+        return f"{base}_archive_"
+
+    def archive_path(self, period: str):
+        return os.path.join(self.archive_dir, f"{self._archive_prefix()}{period}.xlsx")
+
+    def list_archives(self):
+        """Список архивов [(период, путь)] по возрастанию периода"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        prefix = self._archive_prefix()
+        archives = []
+        for name in os.listdir(self.archive_dir):
+            if name.startswith(prefix) and name.endswith(".xlsx"):
+                archives.append((name[len(prefix):-len(".xlsx")], os.path.join(self.archive_dir, name)))
+        return sorted(archives)
+
+    @_with_file
+    def archive_closed_periods(self):
+        """Переносит записи закрытых периодов в архивные файлы и сокращает рабочий файл.
+
+        Возвращает список путей к созданным или дополненным архивам.
+        """
+        current_period = self._period_of(self._today())
+        wb = openpyxl.load_workbook(self.filename)
+
+        moved = {}  # период -> лист -> строки
+        kept = {}
+        for sheet in self.data_sheets(wb):
+            sheet_kept = []
+            for row in sheet.iter_rows(min_row=2, values_only=True):
+                period = self._period_of(row[0])
+                if period and period < current_period:
+                    moved.setdefault(period, {}).setdefault(sheet.title, []).append(row)
+                else:
+                    sheet_kept.append(row)
+            kept[sheet.title] = sheet_kept
+
+        if not moved:
+            print("🗄️ Нет закрытых периодов для архивации")
+            return []
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archives = []
+        skipped = 0
+        for period, sheets in sorted(moved.items()):
+            path = self.archive_path(period)
+            if os.path.exists(path):
+                os.chmod(path, 0o644)
+                archive_wb = openpyxl.load_workbook(path)
+            else:
+                archive_wb = Workbook()
+                archive_wb.remove(archive_wb.active)
+            for sheet_name, rows in sheets.items():
+                if sheet_name in archive_wb.sheetnames:
+                    archive_sheet = archive_wb[sheet_name]
+                else:
+                    archive_sheet = archive_wb.create_sheet(sheet_name)
+                    self._init_sheet(archive_sheet)
+                # Строки, уже перенесенные прошлым запуском, который не успел
+                # сократить рабочий файл, повторно не добавляются
+                archived = Counter(self._row_key(row) for row in archive_sheet.iter_rows(min_row=2, values_only=True))
+                for row in rows:
+                    key = self._row_key(row)
+                    if archived[key]:
+                        archived[key] -= 1
+                        skipped += 1
+                        continue
+                    archive_sheet.append(row)
+            archive_wb.save(path)
+            os.chmod(path, 0o444)
+            archives.append(path)
+            print(f"🗄️ Архив {period}: {sum(len(rows) for rows in sheets.values())} записей -> {path}")
+
+        # Рабочий файл сокращается только после успешной записи архивов
+        for sheet in self.data_sheets(wb):
+            if sheet.max_row > 1:
+                sheet.delete_rows(2, sheet.max_row - 1)
+            for row in kept[sheet.title]:
+                sheet.append(row)
+        wb.save(self.filename)
+        if skipped:
+            print(f"🗄️ Пропущено уже заархивированных записей: {skipped}")
+            if self._ready:
+                # Индекс считал эти записи дважды: и в архиве, и в рабочем файле
+                self._build_index()
+        self._data_changed()
+        print(f"✅ Рабочий файл сокращен до периода {current_period}")
+        return archives
+
+    @staticmethod
+    def _row_key(row):
+        """Значения строки без пустых ячеек в конце - для сравнения строк разных файлов"""
+        row = list(row)
+        while row and row[-1] is None:
+            row.pop()
+        return tuple(row)
+
+# ✅ Команды: у каждой свой файл, папка на Яндекс.Диске и время напоминания
+default_tenant = Tenant(
+    "default", "Основная команда", EXCEL_FILE, YANDEX_DISK_FOLDER,
+    reminder_hour=DEFAULT_REMINDER_HOUR, reminder_minute=DEFAULT_REMINDER_MINUTE
+)
+tenants = TenantRegistry(
+    default_tenant,
+    lambda tenant: ExcelManager(tenant.excel_file, cloud=yandex_disk, cloud_folder=tenant.yandex_folder),
+    tenants_file=TENANTS_FILE,
+    members_file=TENANT_MEMBERS_FILE,
+    users_file=TENANT_USERS_FILE,
+    max_loaded=MAX_LOADED_TENANTS,
+    route_unknown_to_default=TENANT_DEFAULT_OPEN,
+)
 user_data_cache = {}
 
+# ✅ Профилирование по команде администратора
+cpu_profiler = CpuProfiler()
+heap_tracker = HeapTracker()
+
+async def run_blocking(func, *args):
+    """Выполняет блокирующую функцию в пуле потоков (с учетом активного профилирования)"""
+    return await asyncio.to_thread(cpu_profiler.wrap(func), *args)
+
+# ✅ Все исходящие сообщения проходят через один диспетчер с лимитами Telegram
+outbox = OutboundDispatcher(
+    global_rate=OUTBOX_GLOBAL_RATE,
+    chat_rate=OUTBOX_CHAT_RATE,
+    group_rate_per_minute=OUTBOX_GROUP_RATE_PER_MINUTE,
+    max_retries=OUTBOX_MAX_RETRIES
+)
+
 def get_main_menu_keyboard():
     keyboard = [
         ["📝 Отчет"],
@@ -321,12 +1093,47 @@ def get_main_menu_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, input_field_placeholder="Выберите действие...")
 
+def format_entries_count(count: int):
+    """1 запись, 2 записи, 5 записей"""
+    if count % 10 == 1 and count % 100 != 11:
+        word = "запись"
+    elif 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        word = "записи"
+    else:
+        word = "записей"
+    return f"{count} {word}"
+
+def get_limit_exceeded_text():
+    if MAX_ENTRIES_PER_DAY == 1:
+        return (
+            "❌ *Вы уже сделали запись за сегодняшний день.*\n\n"
+            "Чтобы создать новую запись, сначала удалите предыдущую через кнопку \"🗑️ Удалить запись\", "
+            "а затем создайте новую через кнопку \"📝 Отчет\"."
+        )
+    return (
+        f"❌ *Вы уже сделали {format_entries_count(MAX_ENTRIES_PER_DAY)} за сегодняшний день - это максимум.*\n\n"
+        "Чтобы создать новую запись, сначала удалите одну из сегодняшних через кнопку \"🗑️ Удалить запись\", "
+        "а затем создайте новую через кнопку \"📝 Отчет\"."
+    )
+
 def get_yes_no_keyboard():
     return ReplyKeyboardMarkup([["Да", "Нет"]], resize_keyboard=True, one_time_keyboard=True)
 
-async def send_welcome_message(update: Update, user):
+async def get_team_storage(update: Update):
+    """Команда чата и её хранилище; если чат не привязан к команде - подсказывает /join"""
+    tenant = tenants.resolve(update.effective_chat.id, update.effective_user.id)
+    if tenant is None:
+        await update.message.reply_text(
+            "🏢 Этот чат пока не привязан ни к одной команде.\n"
+            "Получите код приглашения у руководителя и отправьте: /join код",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        return None, None
+    return tenant, tenants.manager(tenant)
+
+async def send_welcome_message(update: Update, user, tenant: Tenant):
     yandex_status = "✅ ВКЛЮЧЕН" if yandex_disk else "❌ ВЫКЛЮЧЕН"
-    yandex_folder_info = f"\n📂 *Папка:* {YANDEX_DISK_FOLDER}" if yandex_disk else ""
+    yandex_folder_info = f"\n📂 *Папка:* {tenant.yandex_folder}" if yandex_disk else ""
     
     welcome_text = (
         "🎉 *ДОБРО ПОЖАЛОВАТЬ!* 🎉\n"
@@ -338,7 +1145,7 @@ async def send_welcome_message(update: Update, user):
         "• Все данные автоматически сохраняются в Excel таблицу\n"
         "• У каждого сотрудника свой лист в таблице\n"
         f"• ☁️ *Резервное копирование:* {yandex_status}{yandex_folder_info}\n"
-        "*Важно:* Можно сделать только *1 запись в день*\n"
+        f"*Важно:* Можно сделать не более *{format_entries_count(MAX_ENTRIES_PER_DAY)} в день*\n"
         "*Преимущества:*\n"
         "✅ Всегда актуальная информация о работе\n"
         "✅ Удобный учет времени\n"
@@ -352,23 +1159,28 @@ async def send_welcome_message(update: Update, user):
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     user_id = user.id
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return
     is_new_user = user_id not in WELCOMED_USERS
     if is_new_user:
-        await send_welcome_message(update, user)
+        await send_welcome_message(update, user, tenant)
         WELCOMED_USERS.add(user_id)
         await asyncio.sleep(2)
     if user_id not in USER_SETTINGS:
         USER_SETTINGS[user_id] = {
-            'reminder_time': time(hour=DEFAULT_REMINDER_HOUR, minute=DEFAULT_REMINDER_MINUTE),
+            'reminder_time': time(hour=tenant.reminder_hour, minute=tenant.reminder_minute),
             'username': user.username or "",
             'first_name': user.first_name or "",
             'last_name': user.last_name or "",
             'first_seen': datetime.now()
         }
+    # Напоминания и отчеты из личного чата относятся к команде, из чата которой пришел /start
+    tenants.remember_user(user_id, tenant)
     last_name = user.last_name or user.first_name or ""
-    stats = excel_manager.get_user_stats(user_id, last_name)
+    stats = await run_blocking(manager.get_user_stats, user_id, last_name)
     reminder_time = USER_SETTINGS[user_id]['reminder_time']
-    has_today_entry = excel_manager.has_today_entry(user_id, last_name)
+    today_count = await run_blocking(manager.today_entry_count, user_id, last_name)
     
     if is_new_user:
         message_text = f"👋 *Рад познакомиться, {user.first_name}!*\n"
@@ -380,7 +1192,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"⏰ Напоминание установлено на: *{reminder_time.strftime('%H:%M')}*\n"
     )
     
-    if has_today_entry:
+    if today_count and MAX_ENTRIES_PER_DAY > 1:
+        message_text += f"📝 *Сегодняшние записи:* ✅ {today_count} из {MAX_ENTRIES_PER_DAY}\n"
+    elif today_count:
         message_text += f"📝 *Сегодняшняя запись:* ✅ УЖЕ СДЕЛАНА\n"
     else:
         message_text += f"📝 *Сегодняшняя запись:* ❌ ЕЩЕ НЕТ\n"
@@ -389,7 +1203,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text += f"☁️ *Резервное копирование:* {yandex_status}"
     
     if yandex_disk:
-        message_text += f"\n📂 *Папка на Яндекс.Диске:* {YANDEX_DISK_FOLDER}"
+        message_text += f"\n📂 *Папка на Яндекс.Диске:* {tenant.yandex_folder}"
     
     message_text += "\n\n"
         
@@ -422,13 +1236,14 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     user = update.message.from_user
     last_name = user.last_name or user.first_name or ""
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return ConversationHandler.END
     
-    # Проверяем, есть ли уже запись за сегодня
-    if excel_manager.has_today_entry(user_id, last_name):
+    # Проверяем лимит записей за сегодня
+    if not await run_blocking(manager.can_add_entry, user_id, last_name):
         await update.message.reply_text(
-            "❌ *Вы уже сделали запись за сегодняшний день.*\n\n"
-            "Чтобы создать новую запись, сначала удалите предыдущую через кнопку \"🗑️ Удалить запись\", "
-            "а затем создайте новую через кнопку \"📝 Отчет\".",
+            get_limit_exceeded_text(),
             parse_mode='Markdown',
             reply_markup=get_main_menu_keyboard()
         )
@@ -455,7 +1270,10 @@ async def receive_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_data_cache[user_id] = {}
     user_data_cache[user_id]['time_range'] = time_range
 
-    total_hours = excel_manager.calculate_work_hours(time_range, had_lunch=False)
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return ConversationHandler.END
+    total_hours = manager.calculate_work_hours(time_range, had_lunch=False)
     await update.message.reply_text(
         f"✅ *Отлично!*\n"
         f"⏱️ *Общее время работы:* {total_hours:.2f} ч.\n"
@@ -506,25 +1324,33 @@ async def receive_description(update: Update, context: ContextTypes.DEFAULT_TYPE
     time_range = user_data_cache[user_id]['time_range']
     had_lunch = user_data_cache[user_id]['had_lunch']
     last_name = user.last_name or user.first_name or ""
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return ConversationHandler.END
 
-    success, result = excel_manager.add_entry(user_id, time_range, description, had_lunch, last_name)
+    success, result = await run_blocking(manager.add_entry, user_id, time_range, description, had_lunch, last_name)
     
     if result == "limit_exceeded":
         await update.message.reply_text(
-            "❌ *Вы уже сделали запись за сегодняшний день.*\n\n"
-            "Чтобы создать новую запись, сначала удалите предыдущую через кнопку \"🗑️ Удалить запись\", "
-            "а затем создайте новую через кнопку \"📝 Отчет\".",
+            get_limit_exceeded_text(),
             parse_mode='Markdown',
             reply_markup=get_main_menu_keyboard()
         )
     elif success:
-        stats = excel_manager.get_user_stats(user_id, last_name)
+        stats = await run_blocking(manager.get_user_stats, user_id, last_name)
+        remaining = MAX_ENTRIES_PER_DAY - await run_blocking(manager.today_entry_count, user_id, last_name)
+        if remaining > 0:
+            next_entry_text = f"*Сегодня можно добавить еще {format_entries_count(remaining)}*"
+        else:
+            next_entry_text = "*Новая запись будет доступна завтра*"
         current_date = datetime.now().strftime("%d.%m.%Y")
-        work_hours = excel_manager.calculate_work_hours(time_range, had_lunch)
+        work_hours = manager.calculate_work_hours(time_range, had_lunch)
         
         yandex_sync_text = ""
-        if yandex_disk:
+        if yandex_disk and YANDEX_BACKUP_ON_WRITE:
             yandex_sync_text = "☁️ *Данные автоматически сохранены на Яндекс.Диск*\n"
+        elif yandex_disk:
+            yandex_sync_text = "☁️ *Резервная копия на Яндекс.Диске обновится ночью*\n"
         
         await update.message.reply_text(
             "🎉 *ОТЛИЧНО! Запись сохранена!*\n"
@@ -539,7 +1365,7 @@ async def receive_description(update: Update, context: ContextTypes.DEFAULT_TYPE
             "• 🗑️ *Удалить запись* - если нужно исправить\n"
             "• 📥 *Скачать отчет* - получить полный файл\n"
             "• ☁️ *Синхронизировать* - принудительно сохранить в облако\n"
-            "*Новая запись будет доступна завтра*",
+            f"{next_entry_text}",
             parse_mode='Markdown',
             reply_markup=get_main_menu_keyboard()
         )
@@ -557,12 +1383,40 @@ async def delete_entry_command(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.message.from_user.id
     user = update.message.from_user
     last_name = user.last_name or user.first_name or ""
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return
+
+    # /delete N - удалить N-ю сегодняшнюю запись
+    entry_number = None
+    if context.args:
+        if not context.args[0].isdigit():
+            await update.message.reply_text(
+                "❌ Укажите номер записи, например: /delete 2",
+                reply_markup=get_main_menu_keyboard()
+            )
+            return
+        entry_number = int(context.args[0])
+    elif await run_blocking(manager.today_entry_count, user_id, last_name) > 1:
+        entries = await run_blocking(manager.get_today_entries, user_id, last_name)
+        entries_text = "\n".join(
+            f"{number}. {entry['time_range']} - {entry['description']} ({entry['work_hours']} ч.)"
+            for number, entry in enumerate(entries, start=1)
+        )
+        await update.message.reply_text(
+            "🗑️ *За сегодня несколько записей. Какую удалить?*\n\n"
+            f"{entries_text}\n\n"
+            "Отправь команду /delete с номером записи, например: /delete 2",
+            parse_mode='Markdown',
+            reply_markup=get_main_menu_keyboard()
+        )
+        return
     
-    success, deleted_data = excel_manager.delete_today_entry(user_id, last_name)
+    success, deleted_data = await run_blocking(manager.delete_today_entry, user_id, last_name, entry_number)
     
     if success:
         yandex_sync_text = ""
-        if yandex_disk:
+        if yandex_disk and YANDEX_BACKUP_ON_WRITE:
             yandex_sync_text = "\n☁️ *Изменения сохранены на Яндекс.Диск*"
             
         await update.message.reply_text(
@@ -597,6 +1451,9 @@ async def sync_to_yandex_disk(update: Update, context: ContextTypes.DEFAULT_TYPE
             reply_markup=get_main_menu_keyboard()
         )
         return
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return
     
     await update.message.reply_text(
         "☁️ *Проверяю подключение к Яндекс.Диску...*",
@@ -606,26 +1463,31 @@ async def sync_to_yandex_disk(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     try:
         # Проверяем существование папки
-        if not yandex_disk.check_folder_exists(YANDEX_DISK_FOLDER):
+        if not await run_blocking(yandex_disk.check_folder_exists, manager.cloud_folder):
             await update.message.reply_text(
                 f"❌ *Папка не найдена на Яндекс.Диске!*\n\n"
                 f"Создайте папку вручную:\n"
-                f"`{YANDEX_DISK_FOLDER}`\n\n"
+                f"`{manager.cloud_folder}`\n\n"
                 f"После создания попробуйте снова.",
                 parse_mode='Markdown',
                 reply_markup=get_main_menu_keyboard()
             )
             return
 
-        remote_file_path = f"{YANDEX_DISK_FOLDER}/work_tracker_backup.xlsx"
-        
-        if yandex_disk.upload_file(EXCEL_FILE, remote_file_path):
-            file_info = yandex_disk.get_file_info(remote_file_path)
+        remote_file_path = manager.remote_file_path
+        sync_result = await run_blocking(manager.backup_to_cloud)
+
+        if sync_result:
+            file_info = await run_blocking(yandex_disk.get_file_info, remote_file_path)
+            if sync_result == "unchanged":
+                title = "✅ *Изменений нет - копия на Яндекс.Диске актуальна!*"
+            else:
+                title = "✅ *Синхронизация успешно завершена!*"
             if file_info:
                 file_size = file_info.get('size', 0)
                 modified = file_info.get('modified', '')
                 await update.message.reply_text(
-                    f"✅ *Синхронизация успешно завершена!*\n\n"
+                    f"{title}\n\n"
                     f"📊 *Данные файла на Яндекс.Диске:*\n"
                     f"• 📁 Размер: {int(file_size) / 1024 / 1024:.2f} MB\n"
                     f"• 📅 Обновлен: {modified[:19] if modified else 'Неизвестно'}\n"
@@ -763,7 +1625,10 @@ async def send_daily_reminder(context):
         
         user = USER_SETTINGS.get(user_id, {})
         last_name = user.get('last_name', '') or user.get('first_name', '')
-        has_today_entry = excel_manager.has_today_entry(user_id, last_name)
+        tenant = tenants.user_tenant(user_id)
+        if tenant is None:
+            return
+        has_today_entry = await run_blocking(tenants.manager(tenant).has_today_entry, user_id, last_name)
         
         if has_today_entry:
             message_text = (
@@ -795,8 +1660,39 @@ async def send_daily_reminder(context):
         print(f"❌ Ошибка при отправке напоминания пользователю {user_id}: {e}")
 
 async def download_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return
     try:
-        if not os.path.exists(EXCEL_FILE):
+        archives = manager.list_archives()
+        requested = (context.args or [])[0].lower() if context.args else ""
+
+        # /download <период> или /download all - архивные файлы
+        if requested:
+            if requested == "all":
+                selected = archives
+            else:
+                selected = [(period, path) for period, path in archives if period == requested]
+            if not selected:
+                available = ", ".join(period for period, _ in archives) or "нет"
+                await update.message.reply_text(
+                    f"❌ Архив за период {requested} не найден.\nДоступные архивы: {available}",
+                    reply_markup=get_main_menu_keyboard()
+                )
+                return
+            for period, path in selected:
+                with open(path, 'rb') as file:
+                    await update.message.reply_document(
+                        document=file,
+                        filename=f"work_reports_archive_{period}.xlsx",
+                        caption=f"🗄️ *Архив отчетов за {period}*",
+                        parse_mode='Markdown',
+                        reply_markup=get_main_menu_keyboard()
+                    )
+            if requested != "all":
+                return
+
+        if not os.path.exists(manager.filename):
             await update.message.reply_text(
                 "❌ Файл с отчетами еще не создан. Добавь первую запись через кнопку '📝 Отчет'",
                 reply_markup=get_main_menu_keyboard()
@@ -806,16 +1702,23 @@ async def download_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         yandex_status = ""
         if yandex_disk:
             yandex_status = "\n☁️ *Резервная копия хранится на Яндекс.Диске*"
+
+        archive_info = ""
+        if archives:
+            archive_info = (
+                f"\n🗄️ *Архивы:* {', '.join(period for period, _ in archives)}\n"
+                f"Скачать архив: /download период, все файлы: /download all"
+            )
             
-        with open(EXCEL_FILE, 'rb') as file:
+        with open(manager.filename, 'rb') as file:
             await update.message.reply_document(
                 document=file,
                 filename=f"work_reports_{datetime.now().strftime('%d.%m.%Y')}.xlsx",
                 caption=f"📊 *Вот твой файл с отчетами!*\n"
-                       f"Файл содержит все записи о рабочем времени.\n"
+                       f"Файл содержит записи о рабочем времени за текущий период.\n"
                        f"Каждый пользователь имеет свой лист в файле.\n"
-                       f"*Ограничение:* 1 запись в день на пользователя"
-                       f"{yandex_status}",
+                       f"*Ограничение:* {format_entries_count(MAX_ENTRIES_PER_DAY)} в день на пользователя"
+                       f"{yandex_status}{archive_info}",
                 parse_mode='Markdown',
                 reply_markup=get_main_menu_keyboard()
             )
@@ -827,6 +1730,224 @@ async def download_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_main_menu_keyboard()
         )
 
+def is_admin(user_id: int, tenant: Tenant = None):
+    """Глобальный администратор или администратор указанной команды"""
+    return user_id in ADMIN_USER_IDS or (tenant is not None and user_id in tenant.admins)
+
+def parse_report_period(args):
+    """Период для /team_report: сегодня, вчера, неделя, месяц, ДД.ММ.ГГГГ или ДД.ММ.ГГГГ-ДД.ММ.ГГГГ"""
+    today = datetime.now().date()
+    value = (args[0] if args else "today").lower()
+    if value in ("today", "сегодня"):
+        return today, today
+    if value in ("yesterday", "вчера"):
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+    if value in ("week", "неделя"):
+        return today - timedelta(days=today.weekday()), today
+    if value in ("month", "месяц"):
+        return today.replace(day=1), today
+    try:
+        if '-' in value:
+            start_str, end_str = value.split('-', 1)
+        else:
+            start_str = end_str = value
+        start_date = datetime.strptime(start_str.strip(), "%d.%m.%Y").date()
+        end_date = datetime.strptime(end_str.strip(), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+    if end_date < start_date or (end_date - start_date).days > 366:
+        return None
+    return start_date, end_date
+
+async def team_report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сводка по всей команде за период (только для администраторов)"""
+    tenant, manager = await get_team_storage(update)
+    if not manager:
+        return
+    if not is_admin(update.message.from_user.id, tenant):
+        await update.message.reply_text(
+            "❌ Команда доступна только администраторам.",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return
+
+    period = parse_report_period(context.args)
+    if not period:
+        await update.message.reply_text(
+            "❌ *Неверный период.*\n"
+            "Примеры:\n"
+            "• /team\\_report - за сегодня\n"
+            "• /team\\_report week - за текущую неделю\n"
+            "• /team\\_report month - за текущий месяц\n"
+            "• /team\\_report 01.03.2025-31.03.2025",
+            parse_mode='Markdown',
+            reply_markup=get_main_menu_keyboard()
+        )
+        return
+
+    start_date, end_date = period
+    summary = await run_blocking(manager.team_summary, start_date, end_date)
+    if start_date == end_date:
+        period_text = start_date.strftime('%d.%m.%Y')
+    else:
+        period_text = f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"
+
+    lines = [f"👥 *Отчет по команде за {period_text}*", ""]
+    people = sorted(summary['people'].items(), key=lambda item: item[1]['hours'], reverse=True)
+    for sheet_name, person in people:
+        lines.append(
+            f"• {escape_markdown(sheet_name)}: {person['hours']:.2f} ч. "
+            f"({format_entries_count(person['entries'])})"
+        )
+    if not people:
+        lines.append("Записей за период нет.")
+    lines.append("")
+    lines.append(f"⏱️ *Итого:* {summary['total_hours']:.2f} ч., {format_entries_count(summary['total_entries'])}")
+
+    if summary['missing']:
+        lines.append("")
+        lines.append(f"❗ *Нет отчетов* (рабочих дней в периоде: {summary['workdays']}):")
+        for sheet_name, days_missing in sorted(summary['missing'].items()):
+            lines.append(f"• {escape_markdown(sheet_name)}: {days_missing} дн.")
+    elif summary['workdays']:
+        lines.append("✅ Все отчитались.")
+
+    # Telegram ограничивает длину сообщения 4096 символами
+    chunk = ""
+    for line in lines:
+        if len(chunk) + len(line) + 1 > 4000:
+            await update.message.reply_text(chunk, parse_mode='Markdown')
+            chunk = ""
+        chunk += line + "\n"
+    await update.message.reply_text(chunk, parse_mode='Markdown', reply_markup=get_main_menu_keyboard())
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [секунды] | /profile updates N | /profile stop - профилирование CPU"""
+    if not is_admin(update.message.from_user.id):
+        await update.message.reply_text("❌ Команда доступна только администраторам.")
+        return
+    args = [arg.lower() for arg in (context.args or [])]
+    chat_id = update.message.chat_id
+
+    if args and args[0] == "stop":
+        if not cpu_profiler.active:
+            await update.message.reply_text("ℹ️ Профилирование не запущено.")
+            return
+        await send_profile_results(context.bot)
+        return
+
+    if cpu_profiler.active:
+        await update.message.reply_text("ℹ️ Профилирование уже идет. Остановить: /profile stop")
+        return
+
+    if args and args[0] == "updates":
+        if len(args) < 2 or not args[1].isdigit() or int(args[1]) < 1:
+            await update.message.reply_text("❌ Пример: /profile updates 50")
+            return
+        updates = int(args[1])
+        # +1: само обновление с командой тоже дойдет до счетчика
+        cpu_profiler.start(chat_id, updates=updates + 1)
+        await update.message.reply_text(f"🔬 Профилирую следующие {updates} обновлений...")
+        return
+
+    seconds = int(args[0]) if args and args[0].isdigit() else 30
+    seconds = max(1, min(seconds, 600))
+    cpu_profiler.start(chat_id)
+    context.job_queue.run_once(finish_profile_job, when=seconds, name="profile")
+    await update.message.reply_text(f"🔬 Профилирую {seconds} с...")
+
+async def send_profile_results(bot):
+    chat_id = cpu_profiler.chat_id
+    for job in global_app.job_queue.get_jobs_by_name("profile"):
+        job.schedule_removal()
+    result = cpu_profiler.stop()
+    if not result:
+        return
+    report, raw = result
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    await bot.send_document(chat_id=chat_id, document=report, filename=f"profile_{stamp}.txt",
+                            caption="🔬 Результаты профилирования (cProfile)")
+    await bot.send_document(chat_id=chat_id, document=raw, filename=f"profile_{stamp}.prof",
+                            caption="Файл для snakeviz / pstats")
+
+async def finish_profile_job(context):
+    try:
+        await send_profile_results(context.bot)
+    except Exception as e:
+        print(f"❌ Ошибка при отправке профиля: {e}")
+
+async def count_profiled_update(update: object, context: ContextTypes.DEFAULT_TYPE):
+    """Последняя группа обработчиков: обновление обработано полностью"""
+    if cpu_profiler.update_processed():
+        await send_profile_results(context.bot)
+
+async def heap_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/heap start | snapshot | baseline | diff | stop - снимки памяти tracemalloc"""
+    if not is_admin(update.message.from_user.id):
+        await update.message.reply_text("❌ Команда доступна только администраторам.")
+        return
+    action = (context.args or ["snapshot"])[0].lower()
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if action == "start" or (action in ("snapshot", "diff", "baseline") and not heap_tracker.active):
+        heap_tracker.start()
+        await update.message.reply_text(
+            "🧠 Отслеживание памяти запущено, базовый снимок сохранен.\n"
+            "/heap snapshot - текущее состояние, /heap diff - разница с базовым, /heap stop - выключить"
+        )
+    elif action == "stop":
+        heap_tracker.stop()
+        await update.message.reply_text("🧠 Отслеживание памяти выключено.")
+    elif action == "baseline":
+        await run_blocking(heap_tracker.set_baseline)
+        await update.message.reply_text("🧠 Базовый снимок обновлен.")
+    elif action == "diff":
+        report = await run_blocking(heap_tracker.diff)
+        await update.message.reply_document(document=report, filename=f"heap_diff_{stamp}.txt",
+                                            caption="🧠 Разница с базовым снимком")
+    elif action == "snapshot":
+        report = await run_blocking(heap_tracker.report)
+        await update.message.reply_document(document=report, filename=f"heap_{stamp}.txt",
+                                            caption="🧠 Снимок памяти")
+    else:
+        await update.message.reply_text("❌ Пример: /heap start, /heap snapshot, /heap diff, /heap stop")
+
+async def join_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Привязывает чат к команде по коду приглашения: /join код"""
+    if not context.args:
+        current = tenants.resolve(update.effective_chat.id, update.effective_user.id)
+        current_text = f"Сейчас чат относится к команде *{current.name}*.\n" if current else ""
+        await update.message.reply_text(
+            f"🏢 {current_text}Чтобы присоединиться к команде, отправьте: /join код",
+            parse_mode='Markdown'
+        )
+        return
+
+    chat = update.effective_chat
+    current = tenants.bound(chat.id)
+    if chat.type != ChatType.PRIVATE and current and not is_admin(update.effective_user.id, current):
+        # Иначе любой участник группы перенаправил бы отчеты всех в чужую таблицу
+        await update.message.reply_text(
+            f"⛔ Группа уже привязана к команде {current.name}. "
+            f"Перепривязать её может только администратор команды."
+        )
+        return
+
+    tenant = tenants.join(chat.id, context.args[0].strip())
+    if tenant is None:
+        await update.message.reply_text("❌ Код приглашения не найден. Проверьте его у руководителя.")
+        return
+    tenants.remember_user(update.effective_user.id, tenant)
+    print(f"🏢 Чат {update.effective_chat.id} присоединился к команде {tenant.id}")
+    await update.message.reply_text(
+        f"✅ *Чат присоединен к команде {tenant.name}!*\n"
+        f"Отчеты теперь сохраняются в таблицу этой команды.\n"
+        f"Нажмите /start, чтобы начать.",
+        parse_mode='Markdown',
+        reply_markup=get_main_menu_keyboard()
+    )
+
 async def handle_unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "❌ *Неизвестная команда.*\n"
@@ -863,24 +1984,87 @@ def restore_reminders(application: Application):
             print(f"🔁 Восстановлено напоминание для {user_id} на {settings['reminder_time'].strftime('%H:%M')}")
     print(f"✅ Восстановлено {restored_count} напоминаний.")
 
-def main():
-    global global_app
-    print("🚀 Запуск Work Tracker Bot...")
-    print("📊 Бот для учета рабочего времени")
-    print("💾 Excel файл:", EXCEL_FILE)
-    print("⏱️ Поддержка нескольких периодов + выбор обеда")
-    print("📝 Ограничение: 1 запись в день на пользователя")
-    print(f"☁️  Яндекс.Диск: {'ВКЛЮЧЕН' if yandex_disk else 'ВЫКЛЮЧЕН'}")
-    
+async def archive_job(context):
+    """Ежедневно переносит закрытые периоды в архив и отправляет архивы на Яндекс.Диск"""
+    for tenant in tenants.all():
+        # Команда без файла еще не начала работу - архивировать нечего
+        if not os.path.exists(tenant.excel_file):
+            continue
+        try:
+            # Фоновые задачи работают с файлом и не меняют порядок вытеснения
+            manager = tenants.manager(tenant, touch=False)
+            archives = await run_blocking(manager.archive_closed_periods)
+            if archives and yandex_disk:
+                await run_blocking(manager.backup_archives_to_cloud, archives)
+                await run_blocking(manager.backup_to_cloud)
+        except Exception as e:
+            print(f"❌ Ошибка архивации команды {tenant.id}: {e}")
+
+async def nightly_backup_job(context):
+    """Ночная публикация резервной копии на Яндекс.Диск"""
+    for tenant in tenants.all():
+        if not os.path.exists(tenant.excel_file):
+            continue
+        try:
+            result = await run_blocking(tenants.manager(tenant, touch=False).publish_snapshot)
+            if not result:
+                print(f"⚠️ Ночная резервная копия команды {tenant.id} не опубликована")
+        except Exception as e:
+            print(f"❌ Ошибка ночной резервной копии команды {tenant.id}: {e}")
+
+async def report_outbox_stats(context):
+    """Периодически печатает глубину очереди отправки и задержку доставки"""
+    print(outbox.format_stats())
+
+def background_startup():
+    """Проверки, которые не должны задерживать прием обновлений"""
+    started = perf_counter()
+    # Книги остальных команд загружаются при первом обращении
+    tenants.manager(default_tenant).ensure_ready()
     if yandex_disk:
-        print(f"📂 Папка на Яндекс.Диске: {YANDEX_DISK_FOLDER}")
-        # Проверяем существование папки при запуске
         if yandex_disk.check_folder_exists(YANDEX_DISK_FOLDER):
             print(f"✅ Папка существует на Яндекс.Диске")
         else:
             print(f"⚠️  Папка не найдена. Создайте папку вручную: {YANDEX_DISK_FOLDER}")
+    STARTUP_METRICS['background_seconds'] = perf_counter() - started
+    STARTUP_METRICS['fully_ready_seconds'] = perf_counter() - STARTUP_STARTED
+    print(f"⏱️ Фоновая подготовка завершена за {STARTUP_METRICS['background_seconds']:.2f} с "
+          f"(полная готовность через {STARTUP_METRICS['fully_ready_seconds']:.2f} с после старта)")
+
+async def run_background_startup(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await run_blocking(background_startup)
+    except Exception as e:
+        print(f"❌ Ошибка фоновой подготовки: {e}")
+
+async def on_startup(application: Application):
+    """Вызывается после инициализации бота, перед началом приема обновлений"""
+    STARTUP_METRICS['accepting_updates_seconds'] = perf_counter() - STARTUP_STARTED
+    print(f"⏱️ Бот принимает обновления через {STARTUP_METRICS['accepting_updates_seconds']:.2f} с после старта")
+    # Задача из post_init создается до запуска приложения: через очередь задач
+    # она стартует вместе с приемом обновлений и дожидается остановки бота
+    application.job_queue.run_once(run_background_startup, when=0, name="background_startup")
 
-    application = Application.builder().token(BOT_TOKEN).build()
+def main():
+    global global_app
+    print("🚀 Запуск Work Tracker Bot...")
+    print("📊 Бот для учета рабочего времени")
+    print("⏱️ Поддержка нескольких периодов + выбор обеда")
+    print(f"📝 Ограничение: {format_entries_count(MAX_ENTRIES_PER_DAY)} в день на пользователя")
+    print_config_summary()
+
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .rate_limiter(outbox)
+        .concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(on_startup)
+    )
+    if TELEGRAM_API_URL:
+        # Позволяет работать с локальным Bot API сервером или его тестовой заменой
+        builder = builder.base_url(TELEGRAM_API_URL).base_file_url(TELEGRAM_API_URL.replace('/bot', '/file/bot'))
+        print(f"🔌 Bot API: {TELEGRAM_API_URL}")
+    application = builder.build()
     global_app = application
 
     report_conv_handler = ConversationHandler(
@@ -908,9 +2092,13 @@ def main():
     )
 
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("join", join_command))
     application.add_handler(CommandHandler("download", download_file))
     application.add_handler(CommandHandler("delete", delete_entry_command))
     application.add_handler(CommandHandler("sync", sync_to_yandex_disk))
+    application.add_handler(CommandHandler("team_report", team_report_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("heap", heap_command))
     application.add_handler(MessageHandler(filters.Regex("^(🗑️ Удалить запись)$"), delete_entry_command))
     application.add_handler(MessageHandler(filters.Regex("^(📥 Скачать отчет)$"), download_file))
     application.add_handler(MessageHandler(filters.Regex("^(☁️ Синхронизировать)$"), sync_to_yandex_disk))
@@ -918,9 +2106,25 @@ def main():
     application.add_handler(reminder_conv_handler)
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_menu_buttons))
     application.add_handler(MessageHandler(filters.COMMAND, handle_unknown_command))
+    application.add_handler(TypeHandler(Update, count_profiled_update), group=100)
 
     restore_reminders(application)
 
+    if EXPORT_API_PORT:
+        ExportAPIServer(tenants, EXPORT_API_HOST, EXPORT_API_PORT, EXPORT_API_TOKEN).start()
+    application.job_queue.run_daily(
+        archive_job,
+        time=time(hour=ARCHIVE_HOUR, minute=ARCHIVE_MINUTE, tzinfo=TIMEZONE),
+        name="archive"
+    )
+    if yandex_disk:
+        application.job_queue.run_daily(
+            nightly_backup_job,
+            time=time(hour=NIGHTLY_BACKUP_HOUR, minute=NIGHTLY_BACKUP_MINUTE, tzinfo=TIMEZONE),
+            name="nightly_backup"
+        )
+    application.job_queue.run_repeating(report_outbox_stats, interval=OUTBOX_REPORT_INTERVAL, first=OUTBOX_REPORT_INTERVAL, name="outbox_stats")
+
     print("✅ Бот успешно запущен!")
     print("📱 Ожидаем сообщения от пользователей...")
     try:
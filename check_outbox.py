@@ -0,0 +1,155 @@
+"""Проверка очереди отправки (OutboundDispatcher) на локальной замене Bot API.
+
+Прогоняет сценарии: ограничение потока в личный чат и в группу,
+флуд-контроль (429 с retry_after), повтор после сетевой ошибки (502),
+отказ без повторов на постоянную ошибку (400) и исчерпание попыток. Для каждого печатает результат и счетчики очереди;
+код выхода 1, если какой-то сценарий не прошел.
+
+    python check_outbox.py
+"""
+import asyncio
+import sys
+from time import monotonic
+
+from telegram.error import BadRequest, NetworkError
+from telegram.ext import ExtBot
+
+from fake_bot_api import FakeBotAPI
+from outbox import OutboundDispatcher
+
+TOKEN = "123456:fake"
+# Небольшой допуск на неточность таймеров
+TOLERANCE = 0.05
+
+
+def min_gap(moments):
+    return min((b - a for a, b in zip(moments, moments[1:])), default=None)
+
+
+async def send_all(bot, messages):
+    return await asyncio.gather(*(bot.send_message(chat_id, text) for chat_id, text in messages),
+                                return_exceptions=True)
+
+
+async def private_chat_rate(api, bot, dispatcher):
+    """Сообщения в один личный чат идут не чаще chat_rate, разные чаты - параллельно"""
+    messages = [(chat_id, f"сообщение {i}") for i in range(4) for chat_id in (101, 102)]
+    started = monotonic()
+    results = await send_all(bot, messages)
+    elapsed = monotonic() - started
+    gaps = [min_gap(api.sent_to(chat_id)) for chat_id in (101, 102)]
+    expected_gap = 1 / dispatcher.chat_rate
+    ok = (not any(isinstance(r, Exception) for r in results)
+          and all(gap >= expected_gap - TOLERANCE for gap in gaps)
+          # 4 сообщения в чат: 3 интервала; чаты не должны ждать друг друга
+          and elapsed < 3 * expected_gap + 1)
+    return ok, f"мин. интервал {min(gaps):.2f} с (норма {expected_gap:.2f}), всего {elapsed:.2f} с"
+
+
+async def group_rate(api, bot, dispatcher):
+    """Группы ограничиваются отдельной (меньшей) скоростью"""
+    await send_all(bot, [(-1001, f"группа {i}") for i in range(3)])
+    gap = min_gap(api.sent_to(-1001))
+    expected_gap = 1 / dispatcher.group_rate
+    return gap >= expected_gap - TOLERANCE, f"мин. интервал {gap:.2f} с (норма {expected_gap:.2f})"
+
+
+async def retry_after(api, bot, dispatcher):
+    """429 с retry_after: ждем указанное время и отправляем повторно"""
+    api.flood(retry_after=1, times=1)
+    started = monotonic()
+    await bot.send_message(201, "после флуд-контроля")
+    elapsed = monotonic() - started
+    ok = dispatcher.flood_waits == 1 and elapsed >= 1 and len(api.sent_to(201)) == 1
+    return ok, f"ожидание {elapsed:.2f} с, flood control {dispatcher.flood_waits}"
+
+
+async def retry_after_pauses_everyone(api, bot, dispatcher):
+    """После 429 пауза распространяется на все чаты, а не только на тот, где он случился"""
+    api.flood(retry_after=1, times=1, chat_id=301)
+    first = asyncio.create_task(bot.send_message(301, "первое"))
+    while not dispatcher.flood_waits:
+        await asyncio.sleep(0.01)
+    flooded_at = monotonic()
+    await bot.send_message(302, "второе")
+    await first
+    waited = api.sent_to(302)[0] - flooded_at
+    return waited >= 1 - TOLERANCE, f"другой чат ждал {waited:.2f} с после 429 (retry_after 1 с)"
+
+
+async def network_error(api, bot, dispatcher):
+    """502 от Bot API повторяется с экспоненциальной задержкой"""
+    api.fail(times=2)
+    await bot.send_message(401, "после сетевых ошибок")
+    ok = dispatcher.retried == 2 and dispatcher.delivered == 1 and len(api.sent_to(401)) == 1
+    return ok, f"повторов {dispatcher.retried}, доставлено {dispatcher.delivered}"
+
+
+async def bad_request(api, bot, dispatcher):
+    """400 (например, неразбираемый Markdown) не повторяется и сразу передается вызывающему коду"""
+    api.reject(times=1, chat_id=601)
+    started = monotonic()
+    try:
+        await bot.send_message(601, "*незакрытая разметка", parse_mode="Markdown")
+    except BadRequest:
+        raised = True
+    else:
+        raised = False
+    elapsed = monotonic() - started
+    ok = (raised and dispatcher.retried == 0 and dispatcher.failed == 1
+          and api.requests["sendMessage"] == 1)
+    return ok, (f"исключение {'передано' if raised else 'потеряно'} за {elapsed:.2f} с, "
+                f"запросов {api.requests['sendMessage']}, повторов {dispatcher.retried}")
+
+
+async def retries_exhausted(api, bot, dispatcher):
+    """После max_retries ошибка передается вызывающему коду"""
+    api.fail(times=dispatcher.max_retries + 1)
+    try:
+        await bot.send_message(501, "не дойдет")
+    except NetworkError:
+        raised = True
+    else:
+        raised = False
+    ok = raised and dispatcher.failed == 1 and not api.sent_to(501)
+    return ok, f"исключение {'передано' if raised else 'потеряно'}, ошибок {dispatcher.failed}"
+
+
+SCENARIOS = [
+    ("личный чат", private_chat_rate, {}),
+    ("группа", group_rate, {"group_rate_per_minute": 120}),
+    ("flood control", retry_after, {}),
+    ("flood control - пауза для всех", retry_after_pauses_everyone, {}),
+    ("сетевая ошибка", network_error, {}),
+    ("ошибка запроса (400)", bad_request, {}),
+    ("попытки исчерпаны", retries_exhausted, {"max_retries": 2}),
+]
+
+
+async def run():
+    failures = 0
+    with FakeBotAPI() as api:
+        print(f"Замена Bot API: {api.url}")
+        for name, scenario, options in SCENARIOS:
+            api.reset()
+            dispatcher = OutboundDispatcher(base_backoff=0.05, **options)
+            bot = ExtBot(TOKEN, base_url=api.url, rate_limiter=dispatcher)
+            async with bot:
+                try:
+                    ok, details = await scenario(api, bot, dispatcher)
+                except Exception as e:
+                    ok, details = False, f"исключение: {e!r}"
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {name:<32} {details}")
+            print(f"   {dispatcher.format_stats()}")
+    return failures
+
+
+def main():
+    failures = asyncio.run(run())
+    print(f"\nСценариев не прошло: {failures}" if failures else "\nВсе сценарии прошли")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,16 @@ from datetime import time
 BOT_TOKEN = os.getenv('BOT_TOKEN', '8108841583:AAHNAxCDantgG51JfjyBmDdaubVFWiDHvyI')
 
 # ✅ Автоматическое определение пути для Railway
-if os.path.exists('/app'):
+if os.getenv('EXCEL_DIR'):
+    EXCEL_DIR = os.getenv('EXCEL_DIR')
+elif os.path.exists('/app'):
     # Production на Railway
     EXCEL_DIR = "/app/excel_data"
 else:
     # Локальная разработка
     EXCEL_DIR = "./excel_data"
 
-# Создаем папку
-os.makedirs(EXCEL_DIR, exist_ok=True)
+# Папка создается при первом обращении к файлу, а не при импорте
 EXCEL_FILE = os.path.join(EXCEL_DIR, "work_tracker_new.xlsx")
 
 DEFAULT_REMINDER_HOUR = 18
@@ -21,7 +22,32 @@ USER_SETTINGS = {}
 WELCOMED_USERS = set()
 
 # ✅ Новые константы для ограничения записей
-MAX_ENTRIES_PER_DAY = 1
+MAX_ENTRIES_PER_DAY = int(os.getenv('MAX_ENTRIES_PER_DAY', '1'))
+
+# ✅ Сколько обновлений разных чатов обрабатывается одновременно
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+
+# ✅ Администраторы (через запятую): доступ к /team_report и служебным командам
+ADMIN_USER_IDS = {int(x) for x in os.getenv('ADMIN_USER_IDS', '').split(',') if x.strip()}
+
+# ✅ HTTP API выгрузки записей (0 - выключен)
+EXPORT_API_PORT = int(os.getenv('EXPORT_API_PORT', '0'))
+EXPORT_API_HOST = os.getenv('EXPORT_API_HOST', '127.0.0.1')
+EXPORT_API_TOKEN = os.getenv('EXPORT_API_TOKEN', '')  # если задан, нужен заголовок Authorization: Bearer <токен>
+
+# ✅ Несколько команд в одном боте (описание команд - JSON, см. tenants.py)
+TENANTS_FILE = os.getenv('TENANTS_FILE', os.path.join(EXCEL_DIR, "tenants.json"))
+TENANT_MEMBERS_FILE = os.path.join(EXCEL_DIR, "tenant_members.json")
+# Команда пользователя для личного чата: запоминается по /start или /join и переживает перезапуск
+TENANT_USERS_FILE = os.path.join(EXCEL_DIR, "tenant_users.json")
+MAX_LOADED_TENANTS = int(os.getenv('MAX_LOADED_TENANTS', '8'))  # книг команд в памяти одновременно
+# Чаты без команды работают с основной таблицей; '0' - только по коду приглашения
+TENANT_DEFAULT_OPEN = os.getenv('TENANT_DEFAULT_OPEN', '1') == '1'
+
+# ✅ Архивация: закрытые месяцы ('month') или годы ('year') переносятся в отдельные файлы
+ARCHIVE_GRANULARITY = os.getenv('ARCHIVE_GRANULARITY', 'month')
+ARCHIVE_HOUR = 3
+ARCHIVE_MINUTE = 30
 
 # ✅ Настройки Яндекс.Диск
 YANDEX_DISK_ENABLED = True  # Включить/выключить сохранение на Яндекс.Диск
@@ -29,14 +55,33 @@ YANDEX_DISK_TOKEN = os.getenv('YANDEX_DISK_TOKEN', '')  # OAuth-токен Ян
 
 # ✅ Укажите путь к СУЩЕСТВУЮЩЕЙ папке на Яндекс.Диске
 YANDEX_DISK_FOLDER = "/PolitechCNC/Планирование и загрузка /Планирование"
+# Адрес API можно заменить на локальную замену Яндекс.Диска (fake_yandex_disk.py)
+YANDEX_DISK_API_URL = os.getenv('YANDEX_DISK_API_URL', 'https://cloud-api.yandex.net')
+YANDEX_DISK_TIMEOUT = 60  # секунд на один HTTP-запрос
+YANDEX_BACKUP_FILENAME = "work_tracker_backup.xlsx"
+# Загрузка после каждой записи (иначе только ночная резервная копия и /sync)
+YANDEX_BACKUP_ON_WRITE = os.getenv('YANDEX_BACKUP_ON_WRITE', '0') == '1'
+# Время ночной резервной копии и число хранимых датированных копий
+NIGHTLY_BACKUP_HOUR, NIGHTLY_BACKUP_MINUTE = map(int, os.getenv('NIGHTLY_BACKUP_TIME', '04:00').split(':'))
+BACKUP_GENERATIONS = int(os.getenv('BACKUP_GENERATIONS', '14'))
+# Хеш последней загруженной версии, чтобы не загружать неизмененный файл повторно
+YANDEX_SYNC_STATE_FILE = os.path.join(EXCEL_DIR, "yandex_sync_state.json")
+
+# ✅ Исходящие сообщения: лимиты Telegram и адрес Bot API
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')  # Например, http://127.0.0.1:8081/bot для локального Bot API или fake_bot_api.py
+OUTBOX_GLOBAL_RATE = 30  # сообщений в секунду на весь бот
+OUTBOX_CHAT_RATE = 1  # сообщений в секунду в личный чат
+OUTBOX_GROUP_RATE_PER_MINUTE = 20  # сообщений в минуту в группу
+OUTBOX_MAX_RETRIES = 5
+OUTBOX_REPORT_INTERVAL = 300  # секунд между отчетами о очереди отправки
 
-print("🚀 Конфигурация Work Tracker Bot:")
-print(f"✅ BOT_TOKEN: {'Установлен' if BOT_TOKEN and BOT_TOKEN != '8108841583:AAHNAxCDantgG51JfjyBmDdaubVFWiDHvyI' else 'ПРОВЕРЬТЕ НАСТРОЙКИ'}")
-print(f"📁 Используемая папка: {EXCEL_DIR}")
-print(f"💾 Файл данных: {EXCEL_FILE}")
-print(f"🔧 Папка существует: {os.path.exists(EXCEL_DIR)}")
-print(f"🔧 Можно писать в папку: {os.access(EXCEL_DIR, os.W_OK) if os.path.exists(EXCEL_DIR) else 'НЕТ'}")
-print(f"📊 Максимум записей в день: {MAX_ENTRIES_PER_DAY}")
-print(f"☁️  Яндекс.Диск: {'ВКЛЮЧЕН' if YANDEX_DISK_ENABLED and YANDEX_DISK_TOKEN else 'ВЫКЛЮЧЕН'}")
-if YANDEX_DISK_ENABLED and YANDEX_DISK_TOKEN:
-    print(f"📂 Папка на Яндекс.Диске: {YANDEX_DISK_FOLDER}")
+def print_config_summary():
+    """Печатает сводку конфигурации (без обращений к диску и сети)"""
+    print("🚀 Конфигурация Work Tracker Bot:")
+    print(f"✅ BOT_TOKEN: {'Установлен' if BOT_TOKEN and BOT_TOKEN != '8108841583:AAHNAxCDantgG51JfjyBmDdaubVFWiDHvyI' else 'ПРОВЕРЬТЕ НАСТРОЙКИ'}")
+    print(f"📁 Используемая папка: {EXCEL_DIR}")
+    print(f"💾 Файл данных: {EXCEL_FILE}")
+    print(f"📊 Максимум записей в день: {MAX_ENTRIES_PER_DAY}")
+    print(f"☁️  Яндекс.Диск: {'ВКЛЮЧЕН' if YANDEX_DISK_ENABLED and YANDEX_DISK_TOKEN else 'ВЫКЛЮЧЕН'}")
+    if YANDEX_DISK_ENABLED and YANDEX_DISK_TOKEN:
+        print(f"📂 Папка на Яндекс.Диске: {YANDEX_DISK_FOLDER}")
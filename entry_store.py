@@ -0,0 +1,296 @@
+"""Компактное представление записей для аналитики и массового чтения.
+
+Листы читаются потоком (openpyxl read_only, values_only), и каждая запись
+становится строкой в нескольких столбцах-массивах array: номер дня
+(date.toordinal), номер листа, начало и конец рабочего дня в минутах,
+часы. Объекты Cell, строки дат и словари на запись не хранятся.
+
+Столбцы упорядочены по дате, поэтому выборка за период - это срез,
+найденный двоичным поиском, а суммы по сотруднику, дню и неделе
+считаются одним проходом по срезу. Тексты (время работы и описание)
+загружаются только по запросу - они нужны выгрузке, но не статистике.
+"""
+import re
+from array import array
+from functools import lru_cache
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+import openpyxl
+
+DATE_FORMAT = "%d.%m.%Y"
+NO_TIME = -1  # время работы не удалось разобрать
+
+
+def day_number(value):
+    """Номер дня для даты записи ('ДД.ММ.ГГГГ', date или datetime) или None"""
+    if isinstance(value, date):
+        return value.toordinal()
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip(), DATE_FORMAT).toordinal()
+    except ValueError:
+        return None
+
+
+def parse_hours(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _minutes(value: str):
+    hour, _, minute = value.partition(':')
+    hour, minute = int(hour), int(minute or 0)
+    if hour > 23 or minute > 59:
+        raise ValueError(f"некорректное время: {value}")
+    return hour * 60 + minute
+
+
+@lru_cache(maxsize=4096)
+def parse_periods(time_range):
+    """Периоды работы ("9:00-13:00, 14-18", "с 9 до 18") в минутах от полуночи.
+
+    Возвращает кортеж пар (начало, конец); если конец раньше начала, период
+    переходит через полночь. Время вне суток - ValueError. Значения
+    повторяются ("9:00-18:00"), поэтому результат кешируется.
+    """
+    periods = []
+    for period in re.split(r',\s*', str(time_range or "").strip()):
+        clean_period = re.sub(r'[с\-\–\—]', ' ', period).strip()
+        times = re.findall(r'(\d{1,2}:\d{2}|\d{1,2})', clean_period)
+        if len(times) < 2:
+            continue
+        start, end = _minutes(times[0]), _minutes(times[1])
+        periods.append((start, end if end >= start else end + 24 * 60))
+    return tuple(periods)
+
+
+def time_span(time_range):
+    """Начало первого и конец последнего периода в минутах от полуночи"""
+    try:
+        periods = parse_periods(time_range)
+    except ValueError:
+        periods = ()
+    if not periods:
+        return NO_TIME, NO_TIME
+    return periods[0][0], periods[-1][1]
+
+
+def _bound(value):
+    if value is None or isinstance(value, int):
+        return value
+    return value.toordinal()
+
+
+class EntryStore:
+    __slots__ = ("sheets", "_sheet_ids", "days", "sheet_ids", "starts", "ends", "hours", "totals",
+                 "time_ranges", "descriptions")
+
+    def __init__(self, with_text: bool = False):
+        self.sheets = []  # номер листа -> название
+        self._sheet_ids = {}  # название -> номер листа
+        self.days = array('i')
+        self.sheet_ids = array('H')
+        self.starts = array('h')
+        self.ends = array('h')
+        self.hours = array('d')
+        self.totals = array('i')  # номер листа -> всего записей
+        self.time_ranges = [] if with_text else None
+        self.descriptions = [] if with_text else None
+
+    def __len__(self):
+        return len(self.days)
+
+    @classmethod
+    def load(cls, paths, skip_sheets=(), with_text: bool = False):
+        """Читает записи из книг paths; строки без распознаваемой даты пропускаются"""
+        store = cls(with_text)
+        for path in paths:
+            wb = openpyxl.load_workbook(path, read_only=True)
+            try:
+                for sheet in wb.worksheets:
+                    if sheet.title in skip_sheets:
+                        continue
+                    sheet_id = store.sheet_id(sheet.title)
+                    for row in sheet.iter_rows(min_row=2, max_col=4, values_only=True):
+                        day = day_number(row[0]) if row else None
+                        if day is None:
+                            continue
+                        store._append(day, sheet_id, row[1], parse_hours(row[3] if len(row) > 3 else 0),
+                                      row[2] if len(row) > 2 else None)
+            finally:
+                wb.close()
+        store._sort_by_day()
+        return store
+
+    def sheet_id(self, sheet_name: str):
+        sheet_id = self._sheet_ids.get(sheet_name)
+        if sheet_id is None:
+            sheet_id = self._sheet_ids[sheet_name] = len(self.sheets)
+            self.sheets.append(sheet_name)
+            self.totals.append(0)
+        return sheet_id
+
+    def _append(self, day: int, sheet_id: int, time_range, hours: float, description=None):
+        start, end = time_span(time_range)
+        self.days.append(day)
+        self.sheet_ids.append(sheet_id)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.hours.append(hours)
+        self.totals[sheet_id] += 1
+        if self.time_ranges is not None:
+            self.time_ranges.append(time_range)
+            self.descriptions.append(description)
+
+    def _sort_by_day(self):
+        # Устойчивая сортировка: внутри дня сохраняется порядок файлов и листов
+        days = self.days
+        if all(days[i] <= days[i + 1] for i in range(len(days) - 1)):
+            return
+        order = sorted(range(len(days)), key=days.__getitem__)
+        for name in ("days", "sheet_ids", "starts", "ends", "hours"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in order]))
+        if self.time_ranges is not None:
+            self.time_ranges = [self.time_ranges[i] for i in order]
+            self.descriptions = [self.descriptions[i] for i in order]
+
+    # ---------- Изменения ----------
+
+    def add(self, entry_date, sheet_name: str, time_range, hours, description=None):
+        """Добавляет запись, сохраняя порядок по дате (обычно это запись в конец)"""
+        day = _bound(entry_date)
+        if day is None:
+            return
+        sheet_id = self.sheet_id(sheet_name)
+        position = bisect_right(self.days, day)
+        if position == len(self.days):
+            self._append(day, sheet_id, time_range, parse_hours(hours), description)
+            return
+        start, end = time_span(time_range)
+        self.days.insert(position, day)
+        self.sheet_ids.insert(position, sheet_id)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.hours.insert(position, parse_hours(hours))
+        self.totals[sheet_id] += 1
+        if self.time_ranges is not None:
+            self.time_ranges.insert(position, time_range)
+            self.descriptions.insert(position, description)
+
+    def remove(self, entry_date, sheet_name: str, hours=None):
+        """Удаляет последнюю запись листа за день (с такими часами, если указаны)"""
+        day = _bound(entry_date)
+        sheet_id = self._sheet_ids.get(sheet_name)
+        if day is None or sheet_id is None:
+            return False
+        lo, hi = bisect_left(self.days, day), bisect_right(self.days, day)
+        candidates = [i for i in range(lo, hi) if self.sheet_ids[i] == sheet_id]
+        if hours is not None:
+            hours = parse_hours(hours)
+            candidates = [i for i in candidates if abs(self.hours[i] - hours) < 1e-6] or candidates
+        if not candidates:
+            return False
+        position = candidates[-1]
+        for column in (self.days, self.sheet_ids, self.starts, self.ends, self.hours):
+            del column[position]
+        if self.time_ranges is not None:
+            del self.time_ranges[position]
+            del self.descriptions[position]
+        self.totals[sheet_id] -= 1
+        return True
+
+    # ---------- Выборки и агрегаты ----------
+
+    def _range(self, start=None, end=None):
+        """Границы среза записей за [start, end] (включительно)"""
+        start, end = _bound(start), _bound(end)
+        lo = bisect_left(self.days, start) if start is not None else 0
+        hi = bisect_right(self.days, end) if end is not None else len(self.days)
+        return lo, max(lo, hi)
+
+    def total(self, sheet_name: str):
+        sheet_id = self._sheet_ids.get(sheet_name)
+        return self.totals[sheet_id] if sheet_id is not None else 0
+
+    def count(self, sheet_name: str, entry_date):
+        """Количество записей листа за один день"""
+        sheet_id = self._sheet_ids.get(sheet_name)
+        if sheet_id is None:
+            return 0
+        lo, hi = self._range(entry_date, entry_date)
+        return self.sheet_ids[lo:hi].count(sheet_id)
+
+    def day_count(self, start=None, end=None):
+        lo, hi = self._range(start, end)
+        return len(set(self.days[lo:hi]))
+
+    def sum_by_sheet(self, start=None, end=None):
+        """{лист: [записей, часов]} за период"""
+        lo, hi = self._range(start, end)
+        counts = [0] * len(self.sheets)
+        hours = [0.0] * len(self.sheets)
+        for sheet_id, value in zip(self.sheet_ids[lo:hi], self.hours[lo:hi]):
+            counts[sheet_id] += 1
+            hours[sheet_id] += value
+        return {self.sheets[i]: [counts[i], hours[i]] for i in range(len(self.sheets)) if counts[i]}
+
+    def _sum_by_key(self, start, end, sheet_name, key):
+        lo, hi = self._range(start, end)
+        result = {}
+        days = self.days[lo:hi]
+        hours = self.hours[lo:hi]
+        if sheet_name is None:
+            rows = zip(days, hours)
+        else:
+            sheet_id = self._sheet_ids.get(sheet_name)
+            rows = ((day, value) for day, value, sid in zip(days, hours, self.sheet_ids[lo:hi]) if sid == sheet_id)
+        for day, value in rows:
+            bucket = key(day)
+            result[bucket] = result.get(bucket, 0.0) + value
+        return {date.fromordinal(bucket): value for bucket, value in result.items()}
+
+    def hours_by_day(self, start=None, end=None, sheet_name: str = None):
+        """{дата: часов} за период, по всей команде или по одному листу"""
+        return self._sum_by_key(start, end, sheet_name, lambda day: day)
+
+    def hours_by_week(self, start=None, end=None, sheet_name: str = None):
+        """{понедельник недели: часов} за период"""
+        # Ордината 1 (01.01.0001) - понедельник, поэтому неделя считается делением
+        return self._sum_by_key(start, end, sheet_name, lambda day: day - (day - 1) % 7)
+
+    def days_by_sheet(self, start=None, end=None):
+        """{лист: множество дат с записями} за период"""
+        lo, hi = self._range(start, end)
+        result = {}
+        for day, sheet_id in zip(self.days[lo:hi], self.sheet_ids[lo:hi]):
+            result.setdefault(self.sheets[sheet_id], set()).add(date.fromordinal(day))
+        return result
+
+    def sheets_between(self, start=None, end=None):
+        """Листы, по которым есть записи за период"""
+        lo, hi = self._range(start, end)
+        return {self.sheets[sheet_id] for sheet_id in set(self.sheet_ids[lo:hi])}
+
+    def rows(self, start=None, end=None):
+        """Записи за период в виде словарей (нужен with_text=True)"""
+        lo, hi = self._range(start, end)
+        for i in range(lo, hi):
+            yield {
+                'sheet': self.sheets[self.sheet_ids[i]],
+                'date': date.fromordinal(self.days[i]),
+                'time_range': self.time_ranges[i],
+                'description': self.descriptions[i],
+                'hours': self.hours[i],
+                'start_minute': self.starts[i] if self.starts[i] != NO_TIME else None,
+                'end_minute': self.ends[i] if self.ends[i] != NO_TIME else None,
+            }
+
+    def nbytes(self):
+        """Память под числовые столбцы, байт"""
+        return sum(column.itemsize * len(column)
+                   for column in (self.days, self.sheet_ids, self.starts, self.ends, self.hours, self.totals))
@@ -0,0 +1,197 @@
+"""Локальный HTTP API только для чтения: выгрузка записей для бухгалтерии и ERP.
+
+    GET /entries?tenant=&user=&from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД&page=1&per_page=100  - JSON
+    GET /entries.csv?tenant=&user=&from=&to=                                     - CSV потоком
+    GET /health
+
+tenant - id команды (по умолчанию основная), user - Telegram user_id или
+название листа. Ответы содержат ETag и
+Last-Modified по версии данных; повторный запрос с If-None-Match или
+If-Modified-Since получает 304 без чтения книги.
+"""
+import csv
+import io
+import json
+import hmac
+import threading
+import uuid
+from datetime import date
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CSV_FIELDS = ["date", "user_id", "sheet", "time_range", "description", "hours"]
+MAX_PER_PAGE = 1000
+
+
+class ExportAPIServer:
+    def __init__(self, tenants, host: str = "127.0.0.1", port: int = 8080, token: str = ""):
+        self.tenants = tenants
+        self.token = token
+        # Версия данных начинается заново после перезапуска, поэтому ETag включает id процесса
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="export-api", daemon=True)
+        self._thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"📤 API выгрузки запущен: http://{host}:{port}/entries")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body, headers=None):
+                raw = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(raw)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _not_modified(self, validators):
+                self.send_response(304)
+                for name, value in validators.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _authorized(self):
+                if not api.token:
+                    return True
+                header = self.headers.get("Authorization", "")
+                return hmac.compare_digest(header, f"Bearer {api.token}")
+
+            def _is_fresh(self, etag: str, last_modified: float):
+                if_none_match = self.headers.get("If-None-Match")
+                if if_none_match:
+                    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+                if_modified_since = self.headers.get("If-Modified-Since")
+                if if_modified_since:
+                    try:
+                        return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+                    except (TypeError, ValueError):
+                        return False
+                return False
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == "/health":
+                    self._send_json(200, {"status": "ok", "loaded_tenants": api.tenants.loaded_ids()})
+                    return
+                if parsed.path not in ("/entries", "/entries.csv"):
+                    self._send_json(404, {"error": "not_found"})
+                    return
+                if not self._authorized():
+                    self._send_json(401, {"error": "unauthorized"}, {"WWW-Authenticate": "Bearer"})
+                    return
+
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                try:
+                    date_from = date.fromisoformat(query["from"]) if query.get("from") else None
+                    date_to = date.fromisoformat(query["to"]) if query.get("to") else None
+                    page = max(int(query.get("page", 1)), 1)
+                    per_page = min(max(int(query.get("per_page", 100)), 1), MAX_PER_PAGE)
+                except ValueError:
+                    self._send_json(400, {"error": "bad_request",
+                                          "message": "from/to: ГГГГ-ММ-ДД, page/per_page: числа"})
+                    return
+
+                tenant = api.tenants.get(query.get("tenant"))
+                if tenant is None:
+                    self._send_json(404, {"error": "unknown_tenant"})
+                    return
+
+                # Проверка свежести до любого обращения к данным: версия хранится
+                # в объекте хранилища и без загрузки книги, а само хранилище не
+                # отмечается как используемое и не вытесняет другие команды
+                manager = api.tenants.manager(tenant, touch=False)
+                validators = self._validators(tenant, manager)
+                if self._is_fresh(validators["ETag"], manager.modified_at()):
+                    self._not_modified(validators)
+                    return
+
+                manager = api.tenants.manager(tenant)
+                entries = self._filter(manager.export_entries(), query.get("user"), date_from, date_to)
+                validators = self._validators(tenant, manager)
+                if parsed.path == "/entries.csv":
+                    self._stream_csv(entries, validators)
+                    return
+
+                start = (page - 1) * per_page
+                self._send_json(200, {
+                    "tenant": tenant.id,
+                    "version": manager.data_version,
+                    "page": page,
+                    "per_page": per_page,
+                    "total": len(entries),
+                    "pages": (len(entries) + per_page - 1) // per_page,
+                    "entries": entries[start:start + per_page],
+                }, validators)
+
+            @staticmethod
+            def _validators(tenant, manager):
+                return {
+                    "ETag": f'"{api.boot_id}-{tenant.id}-{manager.data_version}"',
+                    "Last-Modified": formatdate(manager.modified_at(), usegmt=True),
+                    "Cache-Control": "no-cache",
+                }
+
+            @staticmethod
+            def _filter(entries, user, date_from, date_to):
+                low = date_from.isoformat() if date_from else None
+                high = date_to.isoformat() if date_to else None
+                result = []
+                for entry in entries:
+                    if low and entry["date"] < low:
+                        continue
+                    if high and entry["date"] > high:
+                        continue
+                    if user and str(entry["user_id"]) != user and entry["sheet"] != user:
+                        continue
+                    result.append(entry)
+                return result
+
+            def _stream_csv(self, entries, validators):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv; charset=utf-8")
+                self.send_header("Content-Disposition", 'attachment; filename="entries.csv"')
+                self.send_header("Transfer-Encoding", "chunked")
+                for name, value in validators.items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+                buffer = io.StringIO()
+                # BOM, чтобы Excel правильно открыл кириллицу
+                buffer.write("\ufeff")
+                writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction="ignore")
+                writer.writeheader()
+                for index, entry in enumerate(entries, start=1):
+                    writer.writerow(entry)
+                    if index % 500 == 0:
+                        self._write_chunk(buffer.getvalue().encode("utf-8"))
+                        buffer.seek(0)
+                        buffer.truncate()
+                self._write_chunk(buffer.getvalue().encode("utf-8"))
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data: bytes):
+                if data:
+                    self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+        return Handler
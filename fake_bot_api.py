@@ -0,0 +1,210 @@
+"""Локальная замена Telegram Bot API для проверки очереди отправки без сети.
+
+Отвечает на вызовы вида /bot<токен>/<метод>: send*-методы возвращают
+сообщение, getUpdates - пустой список, остальное - true. Можно заранее
+подложить ответы 429 с retry_after (флуд-контроль), 502 (сетевая ошибка
+для python-telegram-bot) и 400 (постоянная ошибка запроса), а также посмотреть, когда и в какой чат
+приходили сообщения.
+
+Запуск отдельно:
+    python fake_bot_api.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot BOT_TOKEN=123:test python bot.py
+"""
+import argparse
+import email.parser
+import json
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_work_tracker_bot"}
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.sent = []  # (время monotonic, метод, chat_id)
+        self._faults = deque()  # [осталось раз, chat_id или None, (код, тело)]
+        self._message_id = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Значение для TELEGRAM_API_URL / ExtBot(base_url=...)"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- Подстановка ошибок ----------
+
+    def flood(self, retry_after: int = 1, times: int = 1, chat_id=None):
+        """Следующие times отправок (в chat_id или в любой чат) получат 429 с retry_after"""
+        body = {"ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after}}
+        with self.lock:
+            self._faults.append([times, chat_id, (429, body)])
+
+    def fail(self, times: int = 1, chat_id=None):
+        """Следующие times отправок получат 502 Bad Gateway (NetworkError в PTB)"""
+        body = {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+        with self.lock:
+            self._faults.append([times, chat_id, (502, body)])
+
+    def reject(self, times: int = 1, chat_id=None,
+               description: str = "Bad Request: can't parse entities"):
+        """Следующие times отправок получат 400 Bad Request (BadRequest в PTB)"""
+        body = {"ok": False, "error_code": 400, "description": description}
+        with self.lock:
+            self._faults.append([times, chat_id, (400, body)])
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.sent.clear()
+            self._faults.clear()
+
+    def sent_to(self, chat_id):
+        """Моменты успешной доставки в чат"""
+        with self.lock:
+            return [moment for moment, _, sent_chat in self.sent if sent_chat == chat_id]
+
+    def _take_fault(self, chat_id):
+        with self.lock:
+            for fault in self._faults:
+                if fault[1] is None or fault[1] == chat_id:
+                    fault[0] -= 1
+                    if fault[0] <= 0:
+                        self._faults.remove(fault)
+                    return fault[2]
+        return None
+
+    def _message(self, chat_id, params):
+        with self.lock:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_type = "private" if chat_id > 0 else "group"
+        message = {"message_id": message_id, "date": int(time.time()),
+                   "chat": {"id": chat_id, "type": chat_type}, "from": BOT_USER}
+        if "text" in params:
+            message["text"] = params["text"]
+        return message
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body):
+                raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _params(self):
+                parsed = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("application/json") and body:
+                    params.update(json.loads(body))
+                elif content_type.startswith("application/x-www-form-urlencoded"):
+                    params.update({key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()})
+                elif content_type.startswith("multipart/form-data"):
+                    message = email.parser.BytesParser().parsebytes(
+                        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+                    for part in message.get_payload():
+                        name = part.get_param("name", header="content-disposition")
+                        if name and not part.get_filename():
+                            params[name] = part.get_payload(decode=True).decode("utf-8")
+                return params
+
+            def _handle(self):
+                route = urlparse(self.path).path
+                method = route.rsplit("/", 1)[-1]
+                params = self._params()
+                with api.lock:
+                    api.requests[method] += 1
+                if api.latency:
+                    time.sleep(api.latency)
+
+                if method == "getMe":
+                    self._reply(200, {"ok": True, "result": BOT_USER})
+                    return
+                if method == "getUpdates":
+                    # Длинный опрос: без обновлений ответ приходит не сразу
+                    time.sleep(min(float(params.get("timeout") or 0), 1.0))
+                    self._reply(200, {"ok": True, "result": []})
+                    return
+
+                chat_id = params.get("chat_id")
+                if chat_id is not None:
+                    try:
+                        chat_id = int(chat_id)
+                    except (TypeError, ValueError):
+                        pass
+                fault = api._take_fault(chat_id)
+                if fault:
+                    self._reply(*fault)
+                    return
+
+                if method.startswith("send") and chat_id is not None:
+                    with api.lock:
+                        api.sent.append((time.monotonic(), method, chat_id))
+                    self._reply(200, {"ok": True, "result": api._message(chat_id, params)})
+                else:
+                    self._reply(200, {"ok": True, "result": True})
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка каждого ответа, с")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.host, args.port, latency=args.latency)
+    print(f"🤖 Замена Bot API слушает {api.url}")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        api.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""Локальная замена REST API Яндекс.Диска для проверок и бенчмарков без сети.
+
+Реализует то, чем пользуется YandexDiskManager: метаданные ресурсов и
+содержимое папок, получение ссылок на загрузку и скачивание, сами PUT/GET
+по этим ссылкам, копирование, удаление и создание папок. Позволяет задать
+задержку ответа, долю ошибок 5xx, ограничение частоты запросов (429) и
+асинхронное копирование (202 и операция, которая завершается не сразу).
+
+Запуск отдельно:
+    python fake_yandex_disk.py --port 8765 --folder "/Backups" --latency 0.05
+    YANDEX_DISK_API_URL=http://127.0.0.1:8765 YANDEX_DISK_TOKEN=test python bot.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+RESOURCES = "/v1/disk/resources"
+OPERATIONS = "/v1/disk/operations/"
+
+
+class FakeYandexDisk:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token: str = None,
+                 latency: float = 0.0, error_rate: float = 0.0, throttle_rps: float = None,
+                 async_copy_polls: int = 0):
+        self.token = token
+        # Сколько опросов операция копирования остается "in-progress" (0 - копирование сразу, 201)
+        self.async_copy_polls = async_copy_polls
+        self.operations = {}  # id -> [осталось опросов, путь, данные]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.files = {}  # путь -> {"data": bytes, "modified": str}
+        self.folders = {"/"}
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._recent = deque()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- Состояние ----------
+
+    @staticmethod
+    def normalize(path: str):
+        if path.startswith("disk:"):
+            path = path[len("disk:"):]
+        if not path.startswith("/"):
+            path = "/" + path
+        return path.rstrip("/") or "/"
+
+    def add_folder(self, path: str):
+        """Создает папку вместе с родительскими"""
+        path = self.normalize(path)
+        with self.lock:
+            while path not in self.folders:
+                self.folders.add(path)
+                path = path.rsplit("/", 1)[0] or "/"
+
+    def put_file(self, path: str, data: bytes):
+        with self.lock:
+            self.files[self.normalize(path)] = {
+                "data": data,
+                "modified": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_received = 0
+            self.bytes_sent = 0
+
+    def resource_info(self, path: str):
+        if path in self.files:
+            entry = self.files[path]
+            data = entry["data"]
+            return {
+                "name": path.rsplit("/", 1)[-1],
+                "path": f"disk:{path}",
+                "type": "file",
+                "size": len(data),
+                "md5": hashlib.md5(data).hexdigest(),
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "modified": entry["modified"],
+            }
+        if path in self.folders:
+            prefix = path.rstrip("/") + "/"
+            children = [p for p in list(self.files) + list(self.folders)
+                        if p != path and p.startswith(prefix) and "/" not in p[len(prefix):]]
+            return {
+                "name": path.rsplit("/", 1)[-1],
+                "path": f"disk:{path}",
+                "type": "dir",
+                "_embedded": {
+                    "path": f"disk:{path}",
+                    "items": [self.resource_info(child) for child in sorted(children)],
+                },
+            }
+        return None
+
+    def _throttled(self):
+        if not self.throttle_rps:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.throttle_rps:
+                return True
+            self._recent.append(now)
+        return False
+
+    def _handler_class(self):
+        disk = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body=None, raw: bytes = None, headers=None):
+                if raw is None:
+                    raw = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if body is None else "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+                with disk.lock:
+                    disk.bytes_sent += len(raw)
+
+            def _error(self, status: int, error: str, headers=None):
+                self._reply(status, {"error": error, "message": error, "description": error}, headers=headers)
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    data = self.rfile.read(length)
+                elif "chunked" in (self.headers.get("Transfer-Encoding") or ""):
+                    chunks = []
+                    while True:
+                        size = int(self.rfile.readline().strip(), 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            break
+                        chunks.append(self.rfile.read(size))
+                        self.rfile.readline()
+                    data = b"".join(chunks)
+                else:
+                    data = b""
+                with disk.lock:
+                    disk.bytes_received += len(data)
+                return data
+
+            def _handle(self, method: str):
+                parsed = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                route = parsed.path
+                endpoint = f"{method} {route}"
+                with disk.lock:
+                    disk.requests[endpoint] += 1
+                body = self._read_body() if method in ("PUT", "POST") else b""
+
+                if disk.latency:
+                    time.sleep(disk.latency)
+                if disk._throttled():
+                    self._error(429, "TooManyRequestsError", headers={"Retry-After": "1"})
+                    return
+                if disk.error_rate and random.random() < disk.error_rate:
+                    self._error(503, "ServiceUnavailableError")
+                    return
+
+                # Ссылки на загрузку и скачивание не требуют токена, как и в настоящем API
+                if route == "/upload-target" and method == "PUT":
+                    path = disk.normalize(query.get("path", ""))
+                    disk.put_file(path, body)
+                    self._reply(201, raw=b"")
+                    return
+                if route == "/download-target" and method == "GET":
+                    path = disk.normalize(query.get("path", ""))
+                    with disk.lock:
+                        entry = disk.files.get(path)
+                    if entry is None:
+                        self._error(404, "DiskNotFoundError")
+                    else:
+                        self._reply(200, raw=entry["data"])
+                    return
+
+                if disk.token and self.headers.get("Authorization") != f"OAuth {disk.token}":
+                    self._error(401, "UnauthorizedError")
+                    return
+                if route.startswith(OPERATIONS) and method == "GET":
+                    with disk.lock:
+                        operation = disk.operations.get(route[len(OPERATIONS):])
+                        if operation and operation[0] > 0:
+                            operation[0] -= 1
+                            status = "in-progress"
+                        elif operation:
+                            status = "success"
+                    if operation is None:
+                        self._error(404, "DiskNotFoundError")
+                        return
+                    if status == "success":
+                        disk.put_file(operation[1], operation[2])
+                    self._reply(200, {"status": status})
+                    return
+                if not route.startswith(RESOURCES):
+                    self._error(404, "NotFound")
+                    return
+
+                action = route[len(RESOURCES):]
+                path = disk.normalize(query.get("path", "/"))
+                base = f"http://{self.headers.get('Host')}"
+
+                if action == "" and method == "GET":
+                    with disk.lock:
+                        info = disk.resource_info(path)
+                    if info is None:
+                        self._error(404, "DiskNotFoundError")
+                    else:
+                        self._reply(200, info)
+                elif action == "" and method == "PUT":
+                    parent = path.rsplit("/", 1)[0] or "/"
+                    if parent not in disk.folders:
+                        self._error(409, "DiskPathDoesntExistsError")
+                    elif path in disk.folders:
+                        self._error(409, "DiskPathPointsToExistentDirectoryError")
+                    else:
+                        disk.add_folder(path)
+                        self._reply(201, {"href": f"{base}{RESOURCES}?path={quote(path)}", "method": "GET"})
+                elif action == "" and method == "DELETE":
+                    with disk.lock:
+                        existed = disk.files.pop(path, None) is not None
+                    self._reply(204, raw=b"") if existed else self._error(404, "DiskNotFoundError")
+                elif action == "/upload" and method == "GET":
+                    parent = path.rsplit("/", 1)[0] or "/"
+                    if parent not in disk.folders:
+                        self._error(409, "DiskPathDoesntExistsError")
+                    elif path in disk.files and query.get("overwrite") != "true":
+                        self._error(409, "DiskResourceAlreadyExistsError")
+                    else:
+                        self._reply(200, {"href": f"{base}/upload-target?path={quote(path)}", "method": "PUT"})
+                elif action == "/download" and method == "GET":
+                    if path not in disk.files:
+                        self._error(404, "DiskNotFoundError")
+                    else:
+                        self._reply(200, {"href": f"{base}/download-target?path={quote(path)}", "method": "GET"})
+                elif action == "/copy" and method == "POST":
+                    source = disk.normalize(query.get("from", ""))
+                    with disk.lock:
+                        entry = disk.files.get(source)
+                    if entry is None:
+                        self._error(404, "DiskNotFoundError")
+                    elif path in disk.files and query.get("overwrite") != "true":
+                        self._error(409, "DiskResourceAlreadyExistsError")
+                    elif disk.async_copy_polls:
+                        operation_id = uuid.uuid4().hex
+                        with disk.lock:
+                            disk.operations[operation_id] = [disk.async_copy_polls, path, entry["data"]]
+                        self._reply(202, {"href": f"{base}{OPERATIONS}{operation_id}", "method": "GET"})
+                    else:
+                        disk.put_file(path, entry["data"])
+                        self._reply(201, {"href": f"{base}{RESOURCES}?path={quote(path)}", "method": "GET"})
+                else:
+                    self._error(405, "MethodNotAllowed")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена API Яндекс.Диска")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token", default=None, help="Требовать этот OAuth-токен")
+    parser.add_argument("--folder", action="append", default=[], help="Создать папку при запуске")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка каждого ответа, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503 (0..1)")
+    parser.add_argument("--throttle", type=float, default=None, help="Запросов в секунду до ответа 429")
+    parser.add_argument("--async-copy", type=int, default=0, help="Опросов до завершения копирования (202)")
+    args = parser.parse_args()
+
+    disk = FakeYandexDisk(args.host, args.port, token=args.token, latency=args.latency,
+                          error_rate=args.error_rate, throttle_rps=args.throttle,
+                          async_copy_polls=args.async_copy)
+    for folder in args.folder:
+        disk.add_folder(folder)
+    print(f"☁️ Замена Яндекс.Диска слушает {disk.url}")
+    try:
+        disk.server.serve_forever()
+    except KeyboardInterrupt:
+        disk.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
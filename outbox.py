@@ -0,0 +1,191 @@
+import asyncio
+import random
+from collections import deque
+from time import monotonic
+
+from telegram.error import BadRequest, Forbidden, InvalidToken, NetworkError, RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+
+
+class TokenBucket:
+    """Простой token bucket: rate токенов в секунду, не более capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float):
+        """Запрещает выдачу токенов на seconds секунд (после RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, monotonic() + seconds)
+        self.tokens = 0
+
+    def is_idle(self):
+        now = monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+    async def acquire(self):
+        while True:
+            now = monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboundDispatcher(BaseRateLimiter):
+    """Единая точка отправки исходящих сообщений.
+
+    Подключается к Application через rate_limiter(), поэтому через неё проходят
+    все вызовы Bot API: reply_text, send_message, reply_document и т.д.
+    Ограничивает общий поток и поток в каждый чат, соблюдает RetryAfter
+    и повторяет отправку с джиттером, собирает глубину очереди и задержку доставки.
+    """
+
+    # Эти запросы не являются исходящими сообщениями и не ограничиваются
+    UNLIMITED_ENDPOINTS = {"getUpdates", "getMe", "deleteWebhook", "setWebhook", "getFile"}
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1,
+                 group_rate_per_minute: float = 20, max_retries: int = 5,
+                 base_backoff: float = 0.5):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_minute / 60
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.chat_buckets = {}
+
+        self.pending = 0
+        self.peak_pending = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.flood_waits = 0
+        self.latencies = deque(maxlen=1000)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self.chat_buckets.clear()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Группы и каналы имеют отрицательный id или @username
+            is_group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+            if is_group:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, 1)
+            self.chat_buckets[chat_id] = bucket
+            if len(self.chat_buckets) > 1000:
+                self._prune_chat_buckets()
+        return bucket
+
+    def _prune_chat_buckets(self):
+        for chat_id in [c for c, b in self.chat_buckets.items() if b.is_idle()]:
+            del self.chat_buckets[chat_id]
+
+    def _backoff(self, attempt: int):
+        delay = self.base_backoff * (2 ** attempt)
+        return delay + random.uniform(0, delay)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in self.UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        max_retries = rate_limit_args if isinstance(rate_limit_args, int) else self.max_retries
+        chat_id = data.get("chat_id")
+        enqueued = monotonic()
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            attempt = 0
+            while True:
+                if chat_id is not None:
+                    await self._chat_bucket(chat_id).acquire()
+                await self.global_bucket.acquire()
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    if attempt >= max_retries:
+                        self.failed += 1
+                        raise
+                    retry_after = e.retry_after
+                    if hasattr(retry_after, "total_seconds"):
+                        retry_after = retry_after.total_seconds()
+                    # Флуд-контроль Telegram распространяется на всего бота
+                    wait = float(retry_after) + random.uniform(0.1, 1.0)
+                    self.global_bucket.pause(wait)
+                    self.flood_waits += 1
+                    self.retried += 1
+                    attempt += 1
+                    print(f"⏳ Flood control ({endpoint}): ждем {wait:.1f} с, попытка {attempt}/{max_retries}")
+                    continue
+                except (BadRequest, Forbidden, InvalidToken):
+                    # Постоянные ошибки (BadRequest - подкласс NetworkError): повтор не поможет
+                    self.failed += 1
+                    raise
+                except TimedOut:
+                    # Сообщение могло быть доставлено, повтор приведет к дублю
+                    self.failed += 1
+                    raise
+                except NetworkError as e:
+                    if attempt >= max_retries:
+                        self.failed += 1
+                        raise
+                    delay = self._backoff(attempt)
+                    self.retried += 1
+                    attempt += 1
+                    print(f"⚠️ Сетевая ошибка ({endpoint}): {e}. Повтор через {delay:.1f} с")
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception:
+                    self.failed += 1
+                    raise
+                self.delivered += 1
+                self.latencies.append(monotonic() - enqueued)
+                return result
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        if latencies:
+            avg = sum(latencies) / len(latencies)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            worst = latencies[-1]
+        else:
+            avg = p95 = worst = 0.0
+        return {
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retried": self.retried,
+            "flood_waits": self.flood_waits,
+            "latency_avg": avg,
+            "latency_p95": p95,
+            "latency_max": worst,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (
+            f"📤 Очередь отправки: {s['pending']} (пик {s['peak_pending']}), "
+            f"доставлено {s['delivered']}, ошибок {s['failed']}, повторов {s['retried']}, "
+            f"flood control {s['flood_waits']}; задержка avg {s['latency_avg']:.2f} с, "
+            f"p95 {s['latency_p95']:.2f} с, max {s['latency_max']:.2f} с"
+        )
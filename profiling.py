@@ -0,0 +1,166 @@
+import io
+import os
+import cProfile
+import pstats
+import tempfile
+import threading
+import functools
+import linecache
+import tracemalloc
+from datetime import datetime
+
+
+class CpuProfiler:
+    """Профилирование работающего бота по команде администратора.
+
+    Основной поток (цикл событий и обработчики) профилируется одним
+    cProfile.Profile. Блокирующие функции, отправленные в пул потоков через
+    wrap(), профилируются отдельно в своих потоках, и результаты объединяются.
+    На Python 3.12+ основной профиль и так охватывает все потоки, поэтому
+    wrap() просто вызывает функцию.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._main_profile = None
+        self._thread_profiles = []
+        self.started_at = None
+        self.chat_id = None
+        self.remaining_updates = None
+
+    @property
+    def active(self):
+        return self._main_profile is not None
+
+    def start(self, chat_id: int, updates: int = None):
+        if self.active:
+            return False
+        self._thread_profiles = []
+        self.chat_id = chat_id
+        self.remaining_updates = updates
+        self.started_at = datetime.now()
+        self._main_profile = cProfile.Profile()
+        self._main_profile.enable()
+        return True
+
+    def update_processed(self):
+        """Отсчитывает обработанные обновления; True, когда пора остановиться"""
+        if not self.active or self.remaining_updates is None:
+            return False
+        self.remaining_updates -= 1
+        return self.remaining_updates <= 0
+
+    def wrap(self, func):
+        """Оборачивает функцию для пула потоков, чтобы она попала в профиль"""
+        if not self.active:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: профилировщик общий для процесса (sys.monitoring),
+                # второй включить нельзя, а основной уже видит и этот поток
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self._lock:
+                    if self.active:
+                        self._thread_profiles.append(profile)
+        return wrapper
+
+    def stop(self):
+        """Останавливает профилирование. Возвращает (текстовый отчет, файл .prof) или None"""
+        if not self.active:
+            return None
+        profile = self._main_profile
+        profile.disable()
+        with self._lock:
+            self._main_profile = None
+            thread_profiles = self._thread_profiles
+            self._thread_profiles = []
+
+        stats = pstats.Stats(profile)
+        for thread_profile in thread_profiles:
+            stats.add(thread_profile)
+
+        duration = (datetime.now() - self.started_at).total_seconds()
+        report = io.StringIO()
+        report.write(f"Профиль за {duration:.1f} с, потоков из пула: {len(thread_profiles)}\n\n")
+        stats.stream = report
+        report.write("=== По суммарному времени (cumulative) ===\n")
+        stats.sort_stats("cumulative").print_stats(60)
+        report.write("\n=== По собственному времени (tottime) ===\n")
+        stats.sort_stats("tottime").print_stats(40)
+
+        fd, dump_path = tempfile.mkstemp(suffix=".prof")
+        os.close(fd)
+        try:
+            stats.dump_stats(dump_path)
+            with open(dump_path, "rb") as f:
+                raw = f.read()
+        finally:
+            os.remove(dump_path)
+        return report.getvalue().encode("utf-8"), raw
+
+
+class HeapTracker:
+    """Снимки кучи через tracemalloc и сравнение с базовым снимком"""
+
+    FRAMES = 25
+
+    def __init__(self):
+        self.baseline = None
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.FRAMES)
+        self.baseline = self._snapshot()
+
+    def stop(self):
+        self.baseline = None
+        tracemalloc.stop()
+
+    def set_baseline(self):
+        self.baseline = self._snapshot()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    def report(self, limit: int = 40):
+        """Текущие крупнейшие места выделения памяти"""
+        snapshot = self._snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        out = io.StringIO()
+        out.write(f"Снимок кучи {datetime.now():%d.%m.%Y %H:%M:%S}\n")
+        out.write(f"Отслеживается: {current / 1024 / 1024:.2f} MB, пик {peak / 1024 / 1024:.2f} MB\n\n")
+        for index, stat in enumerate(snapshot.statistics("traceback")[:limit], start=1):
+            out.write(f"#{index}: {stat.size / 1024:.1f} KiB в {stat.count} блоках\n")
+            for line in stat.traceback.format(limit=8):
+                out.write(f"    {line}\n")
+        return out.getvalue().encode("utf-8")
+
+    def diff(self, limit: int = 40):
+        """Разница с базовым снимком по строкам кода"""
+        snapshot = self._snapshot()
+        out = io.StringIO()
+        out.write(f"Разница с базовым снимком, {datetime.now():%d.%m.%Y %H:%M:%S}\n\n")
+        stats = snapshot.compare_to(self.baseline, "lineno")
+        total = sum(stat.size_diff for stat in stats)
+        out.write(f"Изменение всего: {total / 1024:+.1f} KiB\n\n")
+        for stat in stats[:limit]:
+            out.write(f"{stat}\n")
+        return out.getvalue().encode("utf-8")
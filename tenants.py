@@ -0,0 +1,214 @@
+"""Несколько команд (арендаторов) в одном процессе бота.
+
+Каждая команда получает свой файл данных, свою папку на Яндекс.Диске и
+свои настройки напоминаний по умолчанию. Чат относится к команде, если
+он указан в её описании или присоединился по коду приглашения (/join).
+Личный чат относится к команде, из чата которой пользователь последним
+отправил /start или /join: туда приходят напоминания этой команды.
+Хранилища команд загружаются при первом обращении, а давно не
+использовавшиеся выгружаются из памяти (LRU), так что число одновременно
+загруженных книг ограничено. Объект хранилища у команды один на весь
+процесс: выгрузка освобождает только его индексы, и обработчик, который
+уже получил хранилище, продолжает работать с тем же объектом.
+
+Формат TENANTS_FILE (JSON):
+    [
+        {"id": "cnc", "name": "Цех ЧПУ", "invite_code": "cnc-2025",
+         "chats": [-1001234567890], "admins": [123456789],
+         "yandex_folder": "/PolitechCNC/Планирование",
+         "reminder_hour": 17, "reminder_minute": 30}
+    ]
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class Tenant:
+    def __init__(self, tenant_id: str, name: str, excel_file: str, yandex_folder: str,
+                 invite_code: str = "", chats=(), admins=(),
+                 reminder_hour: int = 18, reminder_minute: int = 0):
+        self.id = tenant_id
+        self.name = name
+        self.excel_file = excel_file
+        self.yandex_folder = yandex_folder
+        self.invite_code = invite_code
+        self.chats = set(chats)
+        self.admins = set(admins)
+        self.reminder_hour = reminder_hour
+        self.reminder_minute = reminder_minute
+
+
+class TenantRegistry:
+    def __init__(self, default_tenant: Tenant, manager_factory, tenants_file: str = "",
+                 members_file: str = "", users_file: str = "", max_loaded: int = 8,
+                 route_unknown_to_default: bool = True):
+        """manager_factory(tenant) создает хранилище команды; у хранилища должны быть ready и unload()"""
+        self.default_tenant = default_tenant
+        self.manager_factory = manager_factory
+        self.tenants_file = tenants_file
+        self.members_file = members_file
+        self.users_file = users_file
+        self.max_loaded = max_loaded
+        self.route_unknown_to_default = route_unknown_to_default
+
+        self.tenants = {default_tenant.id: default_tenant}
+        self._chat_tenants = {}  # chat_id -> tenant_id (из описания команд)
+        self._members = {}  # chat_id -> tenant_id (присоединились по коду)
+        self._users = {}  # user_id -> tenant_id (команда для личного чата)
+        self._managers = {}  # tenant_id -> хранилище (создается один раз)
+        self._loaded = OrderedDict()  # tenant_id загруженных хранилищ, в порядке использования
+        self._lock = threading.Lock()
+        self._configured = False
+
+    def _ensure_loaded(self):
+        # Описание команд читается при первом обращении, а не при импорте
+        with self._lock:
+            if not self._configured:
+                self._load()
+                self._configured = True
+
+    def _load(self):
+        if self.tenants_file and os.path.exists(self.tenants_file):
+            with open(self.tenants_file, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    tenant_id = str(item["id"])
+                    base_dir = os.path.join(os.path.dirname(self.default_tenant.excel_file), "tenants", tenant_id)
+                    self.tenants[tenant_id] = Tenant(
+                        tenant_id,
+                        item.get("name", tenant_id),
+                        item.get("excel_file") or os.path.join(base_dir, "work_tracker.xlsx"),
+                        item.get("yandex_folder") or f"{self.default_tenant.yandex_folder}/{tenant_id}",
+                        invite_code=item.get("invite_code", ""),
+                        chats=item.get("chats", []),
+                        admins=item.get("admins", []),
+                        reminder_hour=item.get("reminder_hour", self.default_tenant.reminder_hour),
+                        reminder_minute=item.get("reminder_minute", self.default_tenant.reminder_minute),
+                    )
+        for tenant in self.tenants.values():
+            for chat_id in tenant.chats:
+                self._chat_tenants[chat_id] = tenant.id
+
+        self._members = self._read_ids(self.members_file, "участников команд")
+        self._users = self._read_ids(self.users_file, "команд пользователей")
+        print(f"🏢 Команд: {len(self.tenants)}, присоединившихся чатов: {len(self._members)}")
+
+    def _read_ids(self, path: str, what: str):
+        """{id чата или пользователя: id команды} из JSON; неизвестные команды пропускаются"""
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return {int(key): tenant_id for key, tenant_id in json.load(f).items() if tenant_id in self.tenants}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Не удалось прочитать {what}: {e}")
+            return {}
+
+    @staticmethod
+    def _write_ids(path: str, mapping: dict):
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({str(key): tenant_id for key, tenant_id in mapping.items()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _save_members(self):
+        self._write_ids(self.members_file, self._members)
+
+    def all(self):
+        self._ensure_loaded()
+        return list(self.tenants.values())
+
+    def get(self, tenant_id: str = None):
+        """Команда по id; без id - команда по умолчанию"""
+        self._ensure_loaded()
+        if not tenant_id:
+            return self.default_tenant
+        return self.tenants.get(tenant_id)
+
+    def bound(self, chat_id: int):
+        """Команда, к которой чат привязан явно (описанием или /join), иначе None"""
+        self._ensure_loaded()
+        tenant_id = self._chat_tenants.get(chat_id) or self._members.get(chat_id)
+        return self.tenants[tenant_id] if tenant_id else None
+
+    def resolve(self, chat_id: int, user_id: int = None):
+        """Команда для чата или None, если чат не привязан и нет команды по умолчанию.
+
+        Для личного чата (chat_id == user_id) сначала берется команда,
+        запомненная для пользователя, - та же, что и у его напоминаний.
+        """
+        if user_id is not None and chat_id == user_id:
+            return self.user_tenant(user_id)
+        tenant = self.bound(chat_id)
+        if tenant:
+            return tenant
+        return self.default_tenant if self.route_unknown_to_default else None
+
+    def user_tenant(self, user_id: int):
+        """Команда пользователя: запомненная, затем привязка его личного чата, затем по умолчанию"""
+        self._ensure_loaded()
+        tenant_id = self._users.get(user_id)
+        if tenant_id:
+            return self.tenants[tenant_id]
+        return self.resolve(user_id)
+
+    def remember_user(self, user_id: int, tenant: Tenant):
+        """Запоминает команду пользователя для личного чата и напоминаний"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._users.get(user_id) == tenant.id:
+                return
+            self._users[user_id] = tenant.id
+            self._write_ids(self.users_file, self._users)
+
+    def join(self, chat_id: int, invite_code: str):
+        """Привязывает чат к команде по коду приглашения. Возвращает команду или None"""
+        self._ensure_loaded()
+        for tenant in self.tenants.values():
+            if tenant.invite_code and tenant.invite_code == invite_code:
+                with self._lock:
+                    self._members[chat_id] = tenant.id
+                    self._save_members()
+                return tenant
+        return None
+
+    def manager(self, tenant: Tenant, touch: bool = True):
+        """Хранилище команды: загружается при первом обращении, вытесняет давно неиспользуемые.
+
+        touch=False - хранилище без отметки об использовании: для обращений,
+        которым не нужны индексы (проверка свежести, копирование файла).
+        """
+        with self._lock:
+            manager = self._managers.get(tenant.id)
+            if manager is None:
+                manager = self._managers[tenant.id] = self.manager_factory(tenant)
+            if not touch:
+                return manager
+            self._loaded[tenant.id] = True
+            self._loaded.move_to_end(tenant.id)
+            self._evict(keep=tenant.id)
+            return manager
+
+    def _evict(self, keep: str):
+        # Хранилище могло загрузиться заново через ссылку, полученную обработчиком
+        # до выгрузки - такие считаются самыми давними
+        for tenant_id, manager in self._managers.items():
+            if manager.ready and tenant_id not in self._loaded:
+                self._loaded[tenant_id] = True
+                self._loaded.move_to_end(tenant_id, last=False)
+        # Команда по умолчанию, запрошенная сейчас и занятые хранилища не вытесняются
+        for tenant_id in list(self._loaded):
+            if len(self._loaded) <= self.max_loaded:
+                break
+            if tenant_id in (self.default_tenant.id, keep):
+                continue
+            if self._managers[tenant_id].unload():
+                del self._loaded[tenant_id]
+                print(f"💤 Хранилище команды {tenant_id} выгружено из памяти")
+
+    def loaded_ids(self):
+        return list(self._loaded)
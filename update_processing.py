@@ -0,0 +1,63 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных чатов с сохранением порядка внутри чата.
+
+    Обновления одного чата (или одного пользователя, если чата нет) выполняются
+    строго по очереди - это нужно состояниям ConversationHandler. Обновления
+    разных чатов обрабатываются одновременно, не более max_concurrent_updates.
+
+    Семафор базового класса захватывается до do_process_update, то есть
+    и обновлениями, ждущими своей очереди в чате. Поэтому он сделан большим
+    (ограничивает только число обновлений в памяти), а место для обработки
+    занимается уже после блокировки чата: один чат, присылающий много
+    обновлений, не отнимает места у остальных.
+    """
+
+    # Обновлений, одновременно принятых в обработку вместе с ожидающими
+    MAX_QUEUED_UPDATES = 10_000
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max(max_concurrent_updates, self.MAX_QUEUED_UPDATES))
+        self._max_concurrent_updates = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks = {}  # ключ -> [asyncio.Lock, число ожидающих]
+
+    @staticmethod
+    def _ordering_key(update: object):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine):
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chat_locks.clear()